@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import pathlib
+import argparse
+import tensorflow as tf
+from model_utils import build_backbone, build_classifier
+from utils import FrameGenerator
+
+
+"""
+Measures training throughput before launching a long run:
+input pipeline alone (FrameGenerator decode), model step alone on synthetic
+clips, and both together, then tells whether training is input- or compute-bound.
+"""
+
+
+ap = argparse.ArgumentParser()
+ap.add_argument("-i", "--data", type=str, required=True,
+                help="path to data dir")
+ap.add_argument("-b", "--batch_size", type=int, default=8,
+                help="batch_size")
+ap.add_argument("-n", "--num_frames", type=int, default=8,
+                help="num_frames")
+ap.add_argument("-s", "--resolution", type=int, default=172,
+                help="Video resolution")
+ap.add_argument("-id", "--model_id", type=str, default='a1',
+                help="model type, eg: a2")
+ap.add_argument("--steps", type=int, default=10,
+                help="number of timed batches per measurement")
+ap.add_argument("--warmup", type=int, default=2,
+                help="number of untimed batches before each measurement")
+ap.add_argument("-o", "--output", type=str, default='benchmark_train.json',
+                help="path to save the results as JSON")
+args = vars(ap.parse_args())
+
+batch_size = args['batch_size']
+num_frames = args['num_frames']
+resolution = args['resolution']
+steps, warmup = args['steps'], args['warmup']
+
+train_dir = pathlib.Path(args['data']) / 'train'
+num_classes = len(os.listdir(os.path.join(args["data"], 'test')))
+
+output_signature = (tf.TensorSpec(shape = (None, None, None, 3), dtype = tf.float32),
+                    tf.TensorSpec(shape = (), dtype = tf.int16))
+train_ds = tf.data.Dataset.from_generator(FrameGenerator(train_dir, num_frames, training = True,
+                                                         output_size = (resolution, resolution)),
+                                          output_signature = output_signature)
+# Same pipeline as train.py, repeated so small datasets do not run dry
+train_ds = train_ds.repeat().batch(batch_size)
+
+
+def timed(fn, batches):
+    """Runs fn on warmup + steps batches, returns clips/sec over the timed ones."""
+    it = iter(batches)
+    for _ in range(warmup):
+        fn(*next(it))
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        fn(*next(it))
+    return steps * batch_size / (time.perf_counter() - t0)
+
+
+# Input pipeline alone
+input_rate = timed(lambda frames, labels: None, train_ds)
+print(f'[INFO] Input pipeline: {input_rate:.2f} clips/sec')
+
+# Model step alone on synthetic clips
+backbone = build_backbone(args['model_id'])
+model = build_classifier(batch_size, num_frames, resolution, backbone, num_classes)
+model.compile(loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+              optimizer=tf.keras.optimizers.Adam(learning_rate = 0.001))
+synthetic = (tf.random.uniform([batch_size, num_frames, resolution, resolution, 3]),
+             tf.random.uniform([batch_size], maxval=num_classes, dtype=tf.int32))
+step_rate = timed(model.train_on_batch, iter(lambda: synthetic, None))
+print(f'[INFO] Model step: {step_rate:.2f} clips/sec')
+
+# End to end
+end_to_end_rate = timed(model.train_on_batch, train_ds)
+print(f'[INFO] End to end: {end_to_end_rate:.2f} clips/sec')
+
+bound = 'input' if input_rate < step_rate else 'compute'
+print(f'[INFO] Training is {bound}-bound '
+      f'(input {input_rate:.2f} vs model {step_rate:.2f} clips/sec)')
+
+results = {
+    'batch_size': batch_size,
+    'num_frames': num_frames,
+    'resolution': resolution,
+    'model_id': args['model_id'],
+    'steps': steps,
+    'cpu_count': os.cpu_count(),
+    'input_clips_per_sec': input_rate,
+    'model_step_clips_per_sec': step_rate,
+    'end_to_end_clips_per_sec': end_to_end_rate,
+    'bound': bound,
+}
+with open(args['output'], 'w') as f:
+    json.dump(results, f, indent=2)
+print(f'[INFO] Saved benchmark to : {args["output"]}')
@@ -0,0 +1,93 @@
+import os
+import json
+
+
+"""
+A model bundle is the exported .tflite plus a sidecar JSON with the same name
+(sport_model.tflite -> sport_model.json) holding everything inference needs:
+class names, the sport-category mapping, input resolution, clip length,
+training frame step and precision. Inference then runs without the dataset dir.
+"""
+
+BUNDLE_VERSION = 1
+
+
+def bundle_path(tflite_path):
+    return os.path.splitext(tflite_path)[0] + '.json'
+
+
+def write_bundle(tflite_path, class_names, label_mapping, model_id, resolution, num_frames,
+                 frame_step, precision):
+    """
+        Writes the metadata sidecar of an exported tflite model.
+
+        Args:
+        tflite_path: Path of the exported tflite model.
+        class_names: Model class names, in output order.
+        label_mapping: Dict of class name -> sport category.
+        model_id: MoViNet variant, eg: a2.
+        resolution: Input resolution of the exported model.
+        num_frames: Frames per clip the model was trained on.
+        frame_step: Source frames between two sampled training frames.
+        precision: Export precision, 32 or 16.
+
+        Return:
+        Path of the sidecar.
+    """
+    meta = {
+        'version': BUNDLE_VERSION,
+        'model_file': os.path.basename(tflite_path),
+        'model_size': os.path.getsize(tflite_path),
+        'model_id': model_id,
+        'class_names': list(class_names),
+        'label_mapping': dict(label_mapping),
+        'resolution': resolution,
+        'num_frames': num_frames,
+        'frame_step': frame_step,
+        'precision': precision,
+    }
+    path = bundle_path(tflite_path)
+    with open(path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return path
+
+
+def load_bundle(tflite_path):
+    """Reads the sidecar of a tflite model, None if the model has no bundle metadata."""
+    path = bundle_path(tflite_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get('version') != BUNDLE_VERSION:
+        raise ValueError(f"{path}: unsupported bundle version {meta.get('version')}")
+    if meta['model_size'] != os.path.getsize(tflite_path):
+        raise ValueError(f'{path} does not belong to {tflite_path} (model size mismatch)')
+    return meta
+
+
+def resolve_model_config(args, default_resolution=224, default_num_frames=8):
+    """
+        Fills resolution and num_frames from the bundle and returns the class names and mapping.
+
+        Args:
+        args: Parsed args with tflite, data, resolution and num_frames; None means not given.
+        default_resolution: Used when there is neither a bundle nor --resolution.
+        default_num_frames: Used when there is neither a bundle nor --num_frames.
+
+        Return:
+        (class names, label mapping or None to keep the built-in one)
+    """
+    meta = load_bundle(args['tflite'])
+    if meta is None:
+        if not args.get('data'):
+            raise ValueError(f"{args['tflite']} has no bundle metadata, pass --data")
+        args['resolution'] = args['resolution'] or default_resolution
+        args['num_frames'] = args['num_frames'] or default_num_frames
+        return sorted(os.listdir(args['data'])), None
+
+    for key in ('resolution', 'num_frames'):
+        if args[key] is not None and args[key] != meta[key]:
+            raise ValueError(f"--{key} {args[key]} does not match the model bundle ({meta[key]})")
+        args[key] = meta[key]
+    return meta['class_names'], meta['label_mapping']
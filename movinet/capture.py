@@ -0,0 +1,233 @@
+import time
+import threading
+import cv2
+import numpy as np
+
+
+class FrameReader:
+    def __init__(self, source, output_size, keep_full=False):
+        """ Reads a video or camera and hands out frames already at model resolution.
+
+        Args:
+            source: Path to video, integer cam-id or an opened cv2.VideoCapture-like object.
+            output_size: (height, width) the model expects.
+            keep_full: Keep the full-resolution BGR frame (only needed to draw/save the overlay).
+        """
+        self.source = source
+        self.output_size = output_size
+        self.keep_full = keep_full
+        opened = not isinstance(source, (int, str))
+        self.is_camera = isinstance(source, int) or opened
+        self.cap = source if opened else cv2.VideoCapture(source)
+        if self.is_camera and not keep_full:
+            self.request_small_mode(output_size)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frames_read = 0
+        self.start_time = time.time()
+
+    def request_small_mode(self, output_size):
+        """ Asks the camera for a capture mode close to the model input, so the driver scales
+        before we ever see a full-size frame. Drivers pick the nearest mode they support, which
+        can be smaller than asked for or have another aspect ratio; then the native mode is kept.
+        """
+        native = (self.cap.get(cv2.CAP_PROP_FRAME_WIDTH), self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if not (native[0] > output_size[1] and native[1] > output_size[0]):
+            return
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, output_size[1])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, output_size[0])
+        width, height = self.cap.get(cv2.CAP_PROP_FRAME_WIDTH), self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        too_small = width < output_size[1] or height < output_size[0]
+        reshaped = height <= 0 or abs(width / height - native[0] / native[1]) > 0.01
+        if too_small or reshaped:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, native[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, native[1])
+
+    def timestamp(self):
+        # Source timestamp for files, wall-clock for cameras
+        if self.is_camera:
+            return time.time() - self.start_time
+        return self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.
+
+    def read(self):
+        """
+            Reads the next frame.
+
+            Return:
+            (success, full BGR frame or None, RGB uint8 frame at model resolution, timestamp)
+        """
+        success, img = self.cap.read()
+        if not success:
+            return False, None, None, None
+        return self.convert(img)
+
+    def convert(self, img):
+        """(True, full BGR frame or None, RGB uint8 frame at model resolution, timestamp) of a decoded frame."""
+        self.frames_read += 1
+        return True, img if self.keep_full else None, to_model_input(img, self.output_size), self.timestamp()
+
+    def seek(self, frame_idx):
+        """Jumps to a frame index of a file source."""
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+    def release(self):
+        self.cap.release()
+
+
+def to_model_input(img, output_size):
+    """Downscales a BGR frame and converts it to RGB at model resolution only."""
+    height, width = output_size
+    interpolation = cv2.INTER_AREA if img.shape[0] > height else cv2.INTER_LINEAR
+    small = cv2.resize(img, (width, height), interpolation=interpolation)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=small)
+
+
+class LatestFrameReader(FrameReader):
+    def __init__(self, source, output_size, keep_full=False):
+        """ Live reader: a capture thread keeps only the freshest frame, stale ones are dropped.
+
+        Args:
+            source: Integer cam-id or an opened cv2.VideoCapture-like object.
+            output_size: (height, width) the model expects.
+            keep_full: Keep the full-resolution BGR frame.
+        """
+        super().__init__(source, output_size, keep_full)
+        # Keep the driver from queueing frames behind our back
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.cond = threading.Condition()
+        self.latest = None
+        self.fresh = False
+        self.running = True
+        self.captured = 0
+        self.dropped = 0
+        self.capture_time = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while self.running:
+                success, img = self.cap.read()
+                # Capture time before the resize and color conversion, so latency covers them
+                captured_at = time.monotonic()
+                frame = self.convert(img) if success else None
+                with self.cond:
+                    if frame is None:
+                        self.running = False
+                        self.cond.notify_all()
+                        break
+                    self.captured += 1
+                    if self.fresh:
+                        self.dropped += 1
+                    self.latest = (frame, captured_at)
+                    self.fresh = True
+                    self.cond.notify_all()
+        finally:
+            # Only this thread ever calls cap.read(), so it is the one to release the capture
+            self.cap.release()
+
+    def read(self):
+        """Blocks until a frame newer than the last one returned is available."""
+        with self.cond:
+            while not self.fresh and self.running:
+                self.cond.wait()
+            if not self.fresh:
+                return False, None, None, None
+            frame, self.capture_time = self.latest
+            self.fresh = False
+            return frame
+
+    def latency(self):
+        """Seconds since the frame returned last was captured (glass-to-label when called after the label)."""
+        return time.monotonic() - self.capture_time
+
+    def release(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        # A stalled camera read keeps the thread alive, it releases the capture once the read returns
+        self.thread.join(timeout=1.)
+
+
+class FixedRateSource:
+    def __init__(self, fps=30., frame_size=(480, 640), num_frames=None):
+        """ Local stand-in for a camera, cv2.VideoCapture-like, producing frames at a fixed rate.
+
+        Args:
+            fps: Frame rate to produce frames at.
+            frame_size: (height, width) of the produced BGR frames.
+            num_frames: Stop after this many frames, None for an endless stream.
+        """
+        self.fps = fps
+        self.frame_size = frame_size
+        self.num_frames = num_frames
+        self.count = 0
+        self.next_time = time.monotonic()
+
+    def read(self):
+        if self.num_frames is not None and self.count >= self.num_frames:
+            return False, None
+        delay = self.next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time += 1. / self.fps
+        # Frame counter encoded in the pixel values, so consumers can tell frames apart
+        frame = np.full((*self.frame_size, 3), self.count % 256, dtype=np.uint8)
+        self.count += 1
+        return True, frame
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FRAME_WIDTH: self.frame_size[1],
+            cv2.CAP_PROP_FRAME_HEIGHT: self.frame_size[0],
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_POS_MSEC: 1000. * self.count / self.fps,
+        }.get(prop, 0)
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # Live mode check against the stand-in camera: a consumer slower than the camera
+    # must see frames dropped, while latency stays bounded by about one consumer step
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fps", type=float, default=30.,
+                    help="frame rate of the stand-in camera")
+    ap.add_argument("--frames", type=int, default=200,
+                    help="number of frames the camera produces")
+    ap.add_argument("--consumer_ms", type=float, default=100.,
+                    help="time the consumer spends per frame, eg: model invocation")
+    ap.add_argument("--max_latency_ms", type=float, default=None,
+                    help="fail above this latency, defaults to consumer_ms + 2 camera frames")
+    args = vars(ap.parse_args())
+
+    reader = LatestFrameReader(FixedRateSource(args['fps'], num_frames=args['frames']), (224, 224))
+    latencies = []
+    while True:
+        success, _, _, _ = reader.read()
+        if not success:
+            break
+        # Once the camera stopped, the last frame waits for the consumer with nothing fresher to replace it
+        streaming = reader.running
+        time.sleep(args['consumer_ms'] / 1000.)
+        if streaming:
+            latencies.append(reader.latency())
+    reader.release()
+
+    max_latency = max(latencies) * 1000
+    limit = args['max_latency_ms'] or args['consumer_ms'] + 2000. / args['fps']
+    print(f"[INFO] {reader.captured} captured, {reader.dropped} dropped, "
+          f"{len(latencies)} consumed while streaming; latency mean {np.mean(latencies) * 1000:.1f} ms, "
+          f"max {max_latency:.1f} ms (limit {limit:.1f} ms)")
+    if args['consumer_ms'] * args['fps'] > 1000. and not reader.dropped:
+        raise SystemExit('[ERROR] Slow consumer but no frames dropped')
+    if max_latency > limit:
+        raise SystemExit('[ERROR] Latency not bounded')
@@ -0,0 +1,147 @@
+import os
+import time
+import argparse
+import sys
+import multiprocessing as mp
+from collections import deque
+import numpy as np
+from bundle import resolve_model_config
+from capture import FrameReader
+from postprocess import label_mapping, CategoryMapper, SegmentTimeline, build_smoother, smoothers
+from postprocess import dominant_sport, merge_segments, save_segments
+
+
+"""
+Splits one long video into time chunks processed by parallel workers.
+Each worker seeks to a little before its chunk and warms up the frame window
+and the smoother on that overlap before it starts emitting segments,
+so the merged timeline matches a sequential run.
+"""
+
+
+def process_chunk(job):
+    """
+        Runs inference on one chunk of the video in a worker process.
+
+        Args:
+        job: Dict with the parsed args, the chunk's [start, end) frame range and the warm-up frame count.
+
+        Return:
+        (chunk index, segments, frames decoded, seconds spent)
+    """
+    # Imported here so the parent process never loads TensorFlow
+    from utils import load_tflite_runner, predict_window
+
+    args = job['args']
+    t0 = time.perf_counter()
+    runner, init_states = load_tflite_runner(args['tflite'], num_threads=args['threads'])
+    image_size = (args['resolution'], args['resolution'])
+    reader = FrameReader(args['source'], image_size)
+    mapper = CategoryMapper(job['label_map'], job['label_mapping'])
+    smoother = build_smoother(args['smoothing'], len(mapper.categories), args['window'], args['alpha'],
+                              args['margin'], max(1, round(args['min_duration'] * (reader.fps or 30))))
+    timeline = SegmentTimeline(mapper.categories)
+    frames_queue = deque(maxlen=args['num_frames'])
+
+    first = max(job['start'] - job['warmup'], 0)
+    reader.seek(first)
+    timestamp = None
+    for frame_idx in range(first, job['end']):
+        success, _, img_rgb, timestamp = reader.read()
+        if not success:
+            break
+        frames_queue.append(img_rgb)
+        if len(frames_queue) < args['num_frames']:
+            continue
+        probs = predict_window(runner, init_states, frames_queue).numpy()
+        category, confidence = smoother.update(mapper(probs))
+        # Warm-up frames only build up state, the previous chunk owns their output
+        if frame_idx >= job['start']:
+            timeline.add(timestamp, category, confidence)
+
+    segments = timeline.close(timestamp)
+    frames_read = reader.frames_read
+    reader.release()
+    return job['index'], segments, frames_read, time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tflite", type=str, required=True,
+                    help="path to tflite model")
+    ap.add_argument("-i", "--source", type=str, required=True,
+                    help="path to video file")
+    ap.add_argument("-s", "--resolution", type=int, default=None,
+                    help="Video resolution, taken from the model bundle if present (default 224)")
+    ap.add_argument("-n", "--num_frames", type=int, default=None,
+                    help="num_frames, taken from the model bundle if present (default 8)")
+    ap.add_argument("-d", "--data", type=str, default=None,
+                    help="path to data/test or data/train dir, only needed without a model bundle")
+    ap.add_argument("-w", "--workers", type=int, default=os.cpu_count(),
+                    help="number of parallel worker processes")
+    ap.add_argument("--chunks", type=int, default=None,
+                    help="number of time chunks, defaults to --workers")
+    ap.add_argument("--overlap", type=float, default=None,
+                    help="seconds of warm-up before each chunk, defaults to cover the frame and smoothing windows")
+    ap.add_argument("--threads", type=int, default=1,
+                    help="interpreter threads per worker")
+    ap.add_argument("--smoothing", type=str, default='majority',
+                    choices=list(smoothers),
+                    help="temporal smoothing of predictions")
+    ap.add_argument("--window", type=int, default=100,
+                    help="majority: number of recent predictions to vote over")
+    ap.add_argument("--alpha", type=float, default=0.1,
+                    help="ema/hysteresis: weight of the newest prediction")
+    ap.add_argument("--margin", type=float, default=0.1,
+                    help="hysteresis: probability margin needed to switch sport")
+    ap.add_argument("--min_duration", type=float, default=1.0,
+                    help="hysteresis: seconds a new sport must hold before switching")
+    ap.add_argument("--timeline", type=str, default=None,
+                    help="path to save the segment timeline, .json or .vtt (subtitle track)")
+    args = vars(ap.parse_args())
+    try:
+        label_map, bundle_mapping = resolve_model_config(args)
+    except ValueError as e:
+        sys.exit(f'[ERROR] {e}')
+
+    reader = FrameReader(args['source'], (args['resolution'], args['resolution']))
+    frame_count, fps = reader.frame_count, reader.fps or 30
+    reader.release()
+    if frame_count <= 0:
+        raise SystemExit(f"[ERROR] Can't read frame count of {args['source']}")
+
+    num_chunks = min(args['chunks'] or args['workers'], frame_count)
+    if args['overlap'] is None:
+        # Enough frames to refill the model window and roughly re-converge the smoother
+        warmup = args['num_frames'] + {
+            'majority': args['window'],
+            'ema': round(3 / args['alpha']),
+            'hysteresis': round(3 / args['alpha']) + round(args['min_duration'] * fps),
+        }[args['smoothing']]
+    else:
+        warmup = round(args['overlap'] * fps)
+
+    bounds = np.linspace(0, frame_count, num_chunks + 1).astype(int)
+    jobs = [{'args': args, 'index': i, 'start': int(bounds[i]), 'end': int(bounds[i + 1]),
+             'warmup': warmup if i else 0, 'label_map': label_map,
+             'label_mapping': bundle_mapping or label_mapping}
+            for i in range(num_chunks)]
+    print(f'[INFO] {frame_count} frames in {num_chunks} chunks, '
+          f'{args["workers"]} workers, {warmup} warm-up frames per chunk')
+
+    t0 = time.perf_counter()
+    # spawn: TensorFlow is not fork-safe
+    with mp.get_context('spawn').Pool(args['workers']) as pool:
+        results = sorted(pool.imap_unordered(process_chunk, jobs))
+    elapsed = time.perf_counter() - t0
+
+    for index, _, frames_read, seconds in results:
+        print(f'[INFO] Chunk {index}: {frames_read} frames in {seconds:.1f}s')
+    segments = merge_segments([segs for _, segs, _, _ in results])
+    for seg in segments:
+        print(f"[{seg['start']:8.2f}s - {seg['end']:8.2f}s] {seg['sport']} {seg['confidence']:.3f}")
+    print(f'[INFO] Video label: {dominant_sport(segments)}')
+    print(f'[INFO] {frame_count} frames in {elapsed:.1f}s ({frame_count / elapsed:.1f} frames/sec)')
+    if args['timeline']:
+        save_segments(segments, args['timeline'])
+        print(f'[INFO] Saved timeline to : {args["timeline"]}')
@@ -0,0 +1,148 @@
+import gzip
+import time
+import numpy as np
+import tensorflow as tf
+
+
+"""
+Magnitude pruning and weight clustering for the trainable part of the classifier
+(the head, plus any backbone blocks left unfrozen), applied as a short fine-tuning
+stage before export. MovinetClassifier is a subclassed model, which the
+tensorflow-model-optimization wrappers cannot clone, so masks and centroids are
+applied directly to the variables from Keras callbacks.
+"""
+
+
+def compressible_variables(model):
+    """Trainable kernels; biases and normalization parameters stay dense."""
+    return [v for v in model.trainable_variables if 'kernel' in v.name and len(v.shape) >= 2]
+
+
+class MagnitudePruning(tf.keras.callbacks.Callback):
+    def __init__(self, variables, target_sparsity=0.5, begin_step=0, end_step=1000, frequency=10):
+        """ Zeroes the smallest weights, ramping sparsity up over the fine-tuning steps.
+
+        Args:
+            variables: Variables to prune.
+            target_sparsity: Final fraction of zero weights per variable.
+            begin_step: Step pruning starts at.
+            end_step: Step the target sparsity is reached at.
+            frequency: Steps between two mask updates.
+        """
+        super().__init__()
+        self.prune_vars = variables
+        self.target_sparsity = target_sparsity
+        self.begin_step = begin_step
+        self.end_step = max(end_step, begin_step + 1)
+        self.frequency = frequency
+        self.masks = [None] * len(variables)
+        self.step = 0
+
+    def sparsity(self):
+        # Polynomial (cubic) schedule: prune fast while the network can recover, then slow down
+        progress = np.clip((self.step - self.begin_step) / (self.end_step - self.begin_step), 0., 1.)
+        return self.target_sparsity * (1. - (1. - progress) ** 3)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step += 1
+        update = self.step >= self.begin_step and (self.step % self.frequency == 0 or self.step >= self.end_step)
+        sparsity = self.sparsity()
+        for i, var in enumerate(self.prune_vars):
+            if update and sparsity > 0:
+                values = np.abs(var.numpy())
+                k = int(values.size * sparsity)
+                if k > 0:
+                    # Exactly k indices, clustered weights tie on a handful of values
+                    mask = np.ones(values.size, dtype=values.dtype)
+                    mask[np.argpartition(values, k - 1, axis=None)[:k]] = 0
+                    self.masks[i] = mask.reshape(values.shape)
+            if self.masks[i] is not None:
+                # Keep pruned weights at zero between mask updates
+                var.assign(var * self.masks[i])
+
+
+def cluster_values(values, n_clusters, iterations=10):
+    """1-D k-means with linear centroid init; zeros (pruned weights) are kept as is."""
+    flat = values.ravel()
+    nonzero = flat != 0
+    data = flat[nonzero]
+    if data.size <= n_clusters:
+        return values
+    centroids = np.linspace(data.min(), data.max(), n_clusters)
+    for _ in range(iterations):
+        assign = np.abs(data[:, None] - centroids[None, :]).argmin(axis=1)
+        for c in range(n_clusters):
+            members = data[assign == c]
+            if members.size:
+                centroids[c] = members.mean()
+    clustered = flat.copy()
+    clustered[nonzero] = centroids[assign]
+    return clustered.reshape(values.shape)
+
+
+class WeightClustering(tf.keras.callbacks.Callback):
+    def __init__(self, variables, n_clusters=16):
+        """ Snaps weights to n_clusters shared values after every fine-tuning epoch.
+
+        Args:
+            variables: Variables to cluster.
+            n_clusters: Number of distinct values per variable.
+        """
+        super().__init__()
+        self.cluster_vars = variables
+        self.n_clusters = n_clusters
+
+    def apply(self):
+        for var in self.cluster_vars:
+            var.assign(cluster_values(var.numpy(), self.n_clusters))
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.apply()
+
+
+def sparsity_of(variables):
+    total = sum(int(np.prod(v.shape)) for v in variables)
+    zeros = sum(int(np.sum(v.numpy() == 0)) for v in variables)
+    return zeros / max(total, 1)
+
+
+def tflite_stats(tflite_path, num_runs=50):
+    """
+        Size, load time and per-frame latency of a streaming tflite model.
+
+        Args:
+        tflite_path: Path to the tflite model.
+        num_runs: Number of timed single-frame invocations.
+
+        Return:
+        Dict of the measurements.
+    """
+    with open(tflite_path, 'rb') as f:
+        content = f.read()
+    t0 = time.perf_counter()
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    runner = interpreter.get_signature_runner()
+    load_time = time.perf_counter() - t0
+
+    inputs = {name: np.zeros(x['shape'], dtype=x['dtype'])
+              for name, x in runner.get_input_details().items()}
+    runner(**inputs)
+    t0 = time.perf_counter()
+    for _ in range(num_runs):
+        runner(**inputs)
+    latency = (time.perf_counter() - t0) / num_runs
+
+    return {
+        'size_mb': len(content) / 2 ** 20,
+        'gzip_size_mb': len(gzip.compress(content)) / 2 ** 20,
+        'load_ms': load_time * 1000,
+        'latency_ms': latency * 1000,
+    }
+
+
+def print_comparison(dense, compressed):
+    """Prints dense vs compressed stats; both dicts may carry an 'accuracy' entry."""
+    print(f"{'':<14}{'dense':>10}{'compressed':>12}")
+    for key in ('accuracy', 'size_mb', 'gzip_size_mb', 'load_ms', 'latency_ms'):
+        if key in dense and key in compressed:
+            print(f'{key:<14}{dense[key]:>10.3f}{compressed[key]:>12.3f}')
@@ -0,0 +1,63 @@
+import os
+import json
+import tensorflow as tf
+from utils import FrameGenerator
+
+
+"""
+Multi-worker data-parallel training helpers. Each worker is its own process,
+configured through the TF_CONFIG environment variable (launch_workers.py sets it
+for local runs over loopback; set it by hand to span machines).
+"""
+
+
+def get_strategy(multi_worker):
+    """MultiWorkerMirroredStrategy when asked for, else the default (single process) strategy."""
+    if multi_worker:
+        return tf.distribute.MultiWorkerMirroredStrategy()
+    return tf.distribute.get_strategy()
+
+
+def _task():
+    tf_config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+    cluster = tf_config.get('cluster', {})
+    task = tf_config.get('task', {})
+    return cluster, task.get('type', 'worker'), task.get('index', 0)
+
+
+def is_chief():
+    """The chief (or worker 0 without an explicit chief) writes checkpoints and exports."""
+    cluster, task_type, task_index = _task()
+    if 'chief' in cluster:
+        return task_type == 'chief'
+    return task_type == 'worker' and task_index == 0
+
+
+def distributed_dataset(path, num_frames, global_batch_size, output_signature, training=False,
+                        output_size=(224, 224)):
+    """
+        Dataset for Model.fit under MultiWorkerMirroredStrategy, sharded per worker.
+        Each worker's generator only decodes its own share of the videos, instead of
+        decoding everything and dropping what other workers read.
+
+        Args:
+        path: Split dir, eg: Dataset/train.
+        num_frames: Number of frames per clip.
+        global_batch_size: Batch size summed over all workers.
+        output_signature: Generator output signature.
+        training: Shuffle the videos.
+        output_size: Pixel size of the frames.
+
+        Return:
+        (tf.keras.utils.experimental.DatasetCreator, steps per epoch)
+    """
+    num_videos = len(FrameGenerator(path, num_frames).get_files_and_class_names()[0])
+
+    def dataset_fn(input_context):
+        shard = (input_context.input_pipeline_id, input_context.num_input_pipelines)
+        generator = FrameGenerator(path, num_frames, training=training, output_size=output_size, shard=shard)
+        ds = tf.data.Dataset.from_generator(generator, output_signature=output_signature)
+        # Repeated, every worker must run the same number of steps
+        return ds.repeat().batch(input_context.get_per_replica_batch_size(global_batch_size))
+
+    return tf.keras.utils.experimental.DatasetCreator(dataset_fn), max(num_videos // global_batch_size, 1)
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import pathlib
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils import FrameGenerator, clips_from_video_file, load_tflite_runner
+
+
+ap = argparse.ArgumentParser()
+ap.add_argument("-i", "--data", type=str, required=True,
+                help="path to data/test dir")
+group = ap.add_mutually_exclusive_group(required=True)
+group.add_argument("--ckpt", type=str,
+                   help="path to trained checkpoint (--save_ckpt of train.py)")
+group.add_argument("--tflite", type=str,
+                   help="path to exported tflite model")
+ap.add_argument("-id", "--model_id", type=str, default='a1',
+                help="model type of the checkpoint, eg: a2")
+ap.add_argument("-n", "--num_frames", type=int, default=8,
+                help="num_frames per clip")
+ap.add_argument("-s", "--resolution", type=int, default=172,
+                help="Video resolution")
+ap.add_argument("-c", "--num_clips", type=int, default=3,
+                help="number of clips sampled per video")
+ap.add_argument("--frame_step", type=int, default=15,
+                help="source frames between two sampled frames")
+ap.add_argument("-b", "--batch_size", type=int, default=8,
+                help="clips per batch (checkpoint only)")
+ap.add_argument("-w", "--workers", type=int, default=4,
+                help="number of parallel video readers / interpreters")
+ap.add_argument("-o", "--report", type=str, default=None,
+                help="path to save the report as JSON")
+args = vars(ap.parse_args())
+
+
+generator = FrameGenerator(pathlib.Path(args['data']), args['num_frames'])
+class_names = generator.class_names
+video_paths, classes = generator.get_files_and_class_names()
+labels = np.array([generator.class_ids_for_name[name] for name in classes])
+num_classes = len(class_names)
+image_size = (args['resolution'], args['resolution'])
+print(f'[INFO] {len(video_paths)} videos, {num_classes} classes')
+
+
+def read_clips(path):
+    return clips_from_video_file(path, args['num_frames'], args['num_clips'],
+                                 output_size=image_size, frame_step=args['frame_step'])
+
+
+#################### Model ###############################
+if args['ckpt']:
+    from model_utils import load_classifier
+    model = load_classifier(args['ckpt'], args['model_id'], num_classes,
+                            args['num_frames'], args['resolution'], args['batch_size'])
+
+    def predict_batch(batch):
+        return model(batch, training=False).numpy()
+else:
+    local = threading.local()
+
+    def get_runner():
+        # Interpreters are not thread-safe, keep one per worker thread
+        if not hasattr(local, 'runner'):
+            local.runner, local.init_states = load_tflite_runner(args['tflite'])
+        return local.runner, local.init_states
+
+    def predict_clip(clip):
+        runner, states = get_runner()
+        for frame in clip:
+            # Input shape: [1, 1, H, W, 3]
+            outputs = runner(**states, image=frame[np.newaxis, np.newaxis])
+            logits = outputs.pop('logits')[0]
+            states = outputs
+        return logits
+
+
+#################### Evaluation ###############################
+def bounded_map(pool, fn, items, ahead):
+    """Ordered pool.map that keeps at most `ahead` items in flight, so decoded clips do not pile up."""
+    in_flight = deque()
+    for item in items:
+        in_flight.append(pool.submit(fn, item))
+        if len(in_flight) >= ahead:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+video_logits = np.zeros((len(video_paths), num_classes), dtype=np.float32)
+total_clips = 0
+read_ahead = 2 * args['workers']
+start = time.perf_counter()
+
+with ThreadPoolExecutor(max_workers=args['workers']) as pool:
+    if args['ckpt']:
+        # Batch clips across videos, the readers decode ahead of the model
+        pending, owners = [], []
+
+        def flush():
+            logits = predict_batch(np.stack(pending))
+            np.add.at(video_logits, owners, logits)
+            pending.clear()
+            owners.clear()
+
+        for idx, clips in enumerate(bounded_map(pool, read_clips, video_paths, read_ahead)):
+            for clip in clips:
+                pending.append(clip)
+                owners.append(idx)
+                if len(pending) == args['batch_size']:
+                    flush()
+            total_clips += len(clips)
+        if pending:
+            flush()
+    else:
+        def evaluate_video(path):
+            clips = read_clips(path)
+            return np.sum([predict_clip(clip) for clip in clips], axis=0), len(clips)
+
+        for idx, (logits, n_clips) in enumerate(bounded_map(pool, evaluate_video, video_paths, read_ahead)):
+            video_logits[idx] = logits
+            total_clips += n_clips
+
+elapsed = time.perf_counter() - start
+# Averaging logits over clips does not change the argmax of the summed logits
+predictions = video_logits.argmax(axis=-1)
+
+
+#################### Report ###############################
+confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+np.add.at(confusion, (labels, predictions), 1)
+true_pos = np.diag(confusion)
+precision = true_pos / np.maximum(confusion.sum(axis=0), 1)
+recall = true_pos / np.maximum(confusion.sum(axis=1), 1)
+accuracy = true_pos.sum() / max(len(labels), 1)
+
+width = max(len(name) for name in class_names)
+print(f'\n{"class":<{width}}  precision  recall  support')
+for i, name in enumerate(class_names):
+    print(f'{name:<{width}}  {precision[i]:9.3f}  {recall[i]:6.3f}  {confusion[i].sum():7d}')
+
+print('\nConfusion matrix (rows: true, cols: predicted)')
+for i, name in enumerate(class_names):
+    print(f'{name:<{width}}  ' + ' '.join(f'{v:4d}' for v in confusion[i]))
+
+clips_per_sec = total_clips / elapsed
+videos_per_sec = len(video_paths) / elapsed
+print(f'\nAccuracy: {accuracy:.4f}')
+print(f'Throughput: {clips_per_sec:.2f} clips/sec, {videos_per_sec:.2f} videos/sec '
+      f'({total_clips} clips in {elapsed:.2f}s)')
+
+if args['report']:
+    report = {
+        'model': args['ckpt'] or args['tflite'],
+        'model_id': args['model_id'],
+        'num_frames': args['num_frames'],
+        'resolution': args['resolution'],
+        'num_clips': args['num_clips'],
+        'class_names': class_names,
+        'accuracy': float(accuracy),
+        'precision': precision.tolist(),
+        'recall': recall.tolist(),
+        'confusion_matrix': confusion.tolist(),
+        'clips_per_sec': clips_per_sec,
+        'videos_per_sec': videos_per_sec,
+        'elapsed_sec': elapsed,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args['report'])), exist_ok=True)
+    with open(args['report'], 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'[INFO] Saved report to : {args["report"]}')
@@ -1,59 +1,153 @@
-import cv2
-import tensorflow as tf
-from collections import deque, Counter
 import os
+import cv2
+import numpy as np
+from collections import deque
+import sys
 import argparse
 import time
+from capture import FrameReader, LatestFrameReader
+from motion import MotionGate
+from video_writer import AsyncVideoWriter
+from bundle import resolve_model_config
+from profiling import StageProfiler, profile_tflite_ops
+from metrics import MetricsRegistry, RateLimitedPrinter
+from result_cache import ResultCache, fingerprint_file, hash_file
+from postprocess import label_mapping, CategoryMapper, EarlyExit, SegmentTimeline, build_smoother, smoothers
+from postprocess import dominant_sport, save_segments
 
 ap = argparse.ArgumentParser()
 ap.add_argument("--tflite", type=str, required=True,
                 help="path to tflite model")
 ap.add_argument("-i", "--source", type=str, required=True,
                 help="path to video or cam-id")
-ap.add_argument("-s", "--resolution", type=int, default=224,
-                help="Video resolution")
-ap.add_argument("-n", "--num_frames", type=int, default=8,
-                help="num_frames")
-ap.add_argument("-d", "--data", type=str, required=True,
-                help="path to data/test or data/train dir")
+ap.add_argument("-s", "--resolution", type=int, default=None,
+                help="Video resolution, taken from the model bundle if present (default 224)")
+ap.add_argument("-n", "--num_frames", type=int, default=None,
+                help="num_frames, taken from the model bundle if present (default 8)")
+ap.add_argument("-d", "--data", type=str, default=None,
+                help="path to data/test or data/train dir, only needed without a model bundle")
 ap.add_argument("--save", action='store_true',
-                help="Save video")
+                help="Save annotated video (re-encodes every frame)")
+ap.add_argument("-o", "--output", type=str, default='output.mp4',
+                help="path to save annotated video")
+ap.add_argument("--smoothing", type=str, default='majority',
+                choices=list(smoothers),
+                help="temporal smoothing of predictions")
+ap.add_argument("--window", type=int, default=100,
+                help="majority: number of recent predictions to vote over")
+ap.add_argument("--alpha", type=float, default=0.1,
+                help="ema/hysteresis: weight of the newest prediction")
+ap.add_argument("--margin", type=float, default=0.1,
+                help="hysteresis: probability margin needed to switch sport")
+ap.add_argument("--min_duration", type=float, default=1.0,
+                help="hysteresis: seconds a new sport must hold before switching")
+ap.add_argument("--timeline", type=str, default=None,
+                help="path to save the segment timeline, .json or .vtt (subtitle track)")
+ap.add_argument("--live", action='store_true',
+                help="low-latency live mode: always process the freshest frame, drop stale ones")
+ap.add_argument("--early_exit", action='store_true',
+                help="file sources: stop once the whole-file label is stable")
+ap.add_argument("--exit_min_frames", type=int, default=64,
+                help="early exit: minimum frames read before stopping")
+ap.add_argument("--exit_margin", type=float, default=0.3,
+                help="early exit: minimum top-2 probability margin of a window")
+ap.add_argument("--exit_patience", type=int, default=10,
+                help="early exit: consecutive agreeing non-overlapping windows (num_frames apart) needed to stop")
+ap.add_argument("--probes", type=int, default=0,
+                help="early exit: evenly spaced windows over the rest of the file used to verify the label")
+ap.add_argument("--cache", type=str, default=None,
+                help="dir of the result cache shared by workers, file sources only")
+ap.add_argument("--cache_size", type=int, default=512,
+                help="result cache disk budget in MB")
+ap.add_argument("--profile", type=str, default=None,
+                help="run dir for a per-stage and per-op profile of the first invocations")
+ap.add_argument("--profile_invocations", type=int, default=100,
+                help="number of model invocations to profile")
+ap.add_argument("--log_interval", type=float, default=1.0,
+                help="seconds between prediction/FPS prints, 0 prints every frame")
+ap.add_argument("--quiet", action='store_true',
+                help="no per-frame prints")
+ap.add_argument("--metrics_port", type=int, default=None,
+                help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+ap.add_argument("--metrics_json", type=str, default=None,
+                help="path to write periodic JSON metrics snapshots to")
+ap.add_argument("--metrics_interval", type=float, default=10.,
+                help="seconds between JSON metrics snapshots")
+ap.add_argument("--motion_gate", action='store_true',
+                help="skip model invocations while the scene is static")
+ap.add_argument("--motion_threshold", type=float, default=2.0,
+                help="motion gate: mean gray difference (0-255) below which the scene is static")
+ap.add_argument("--scene_cut", type=float, default=40.0,
+                help="motion gate: mean gray difference (0-255) to the previous frame that counts as a scene cut")
+ap.add_argument("--max_skip", type=int, default=150,
+                help="motion gate: force an inference after this many skipped frames, 0 to disable")
 
 args = vars(ap.parse_args())
 video_path = args["source"]
 
+# Class names, sport mapping and input shape come with the model bundle
+try:
+    label_map, bundle_mapping = resolve_model_config(args)
+except ValueError as e:
+    sys.exit(f'[ERROR] {e}')
+if bundle_mapping is not None:
+    label_mapping = bundle_mapping
+
+
+#################### Result Cache ###############################
+# Repeated clips are answered from the cache without loading the model.
+# The annotated video still needs decoding, so --save bypasses the cache.
+# Only local files can be fingerprinted, cameras and stream URLs are never cached.
+cache = cache_key = None
+if args['cache'] and os.path.isfile(video_path) and not args['save']:
+    cache = ResultCache(args['cache'], args['cache_size'] << 20)
+    # Everything that can change the result, but not where it is written to
+    ignored = {'source', 'tflite', 'data', 'save', 'output', 'timeline', 'cache', 'cache_size',
+               'profile', 'profile_invocations', 'log_interval', 'quiet',
+               'metrics_port', 'metrics_json', 'metrics_interval'}
+    params = {k: v for k, v in args.items() if k not in ignored}
+    params['label_map'] = label_map
+    params['label_mapping'] = label_mapping
+    cache_key = ResultCache.make_key(fingerprint_file(video_path), hash_file(args['tflite']), params)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        for seg in cached['segments']:
+            print(f"[{seg['start']:8.2f}s - {seg['end']:8.2f}s] {seg['sport']} {seg['confidence']:.3f}")
+        print(f"[INFO] Cached result: {cached['label']}")
+        if args['timeline']:
+            save_segments(cached['segments'], args['timeline'])
+            print(f'[INFO] Saved timeline to : {args["timeline"]}')
+        sys.exit(0)
+
+# TensorFlow is only imported past the cache lookup, a hit never pays for it
+import tensorflow as tf
+from utils import load_tflite_runner, predict_window
+
 # Load TFLite Model
-# Create the interpreter and signature runner
-interpreter = tf.lite.Interpreter(model_path=args["tflite"])
-runner = interpreter.get_signature_runner()
-init_states = {
-    name: tf.zeros(x['shape'], dtype=x['dtype'])
-    for name, x in runner.get_input_details().items()
-}
-del init_states['image']
+# Create the interpreter and signature runner, TFLite memory-maps the model file
+runner, init_states = load_tflite_runner(args["tflite"])
 
 
 #################### Video Stream ###############################
 if video_path.isnumeric():
     video_path = int(video_path)
-cap = cv2.VideoCapture(video_path)
+image_size = (args['resolution'], args['resolution'])
+# Full-resolution frames are only kept for the overlay of the saved video
+reader_cls = LatestFrameReader if args['live'] else FrameReader
+reader = reader_cls(video_path, image_size, keep_full=args['save'])
+latencies = deque(maxlen=10000)
 
-original_video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-original_video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-fps = cap.get(cv2.CAP_PROP_FPS)
+original_video_width = reader.width
+original_video_height = reader.height
+fps = reader.fps
 
-# Write Video
+# Write Video, only when asked for and off the main loop
 if args['save']:
-    out_vid = cv2.VideoWriter(f'output.mp4', 
-                         cv2.VideoWriter_fourcc(*'mp4v'),
-                         fps, (original_video_width, original_video_height))
-
-image_size = (args['resolution'], args['resolution'])
+    out_vid = AsyncVideoWriter(args['output'], fps,
+                               (original_video_width, original_video_height))
 
 frames_queue = deque(maxlen=args['num_frames'])
 
-label_map = sorted(os.listdir(args['data']))
-
 def get_top_k(probs, k=5, label_map=label_map):
     """Outputs the top k model labels and probabilities on the given video."""
     top_predictions = tf.argsort(probs, axis=-1, direction='DESCENDING')[:k]
@@ -64,76 +158,180 @@ def get_top_k(probs, k=5, label_map=label_map):
 
 p_time = 0
 
-# Define label mapping
-label_mapping = {
-    'BaseballPitch': 'baseball',
-    'CricketBowling': 'cricket',
-    'CricketShot': 'cricket',
-    'SoccerJuggling': 'soccer',
-    'SoccerPenalty': 'soccer',
-}
+# Fold class probabilities into sport categories and smooth them over time
+mapper = CategoryMapper(label_map, label_mapping)
+smoother = build_smoother(args['smoothing'], len(mapper.categories), args['window'], args['alpha'],
+                          args['margin'], max(1, round(args['min_duration'] * (fps or 30))))
+timeline = SegmentTimeline(mapper.categories)
+timestamp = 0.
+category_probs = None
+early_exit = None
+if args['early_exit'] and not isinstance(video_path, int):
+    early_exit = EarlyExit(args['exit_min_frames'], args['exit_margin'], args['exit_patience'],
+                           spacing=args['num_frames'])
+exited = False
+# Whether the whole file was decoded, only complete (or early-exit) results are cached
+reached_end = False
+gate = MotionGate(args['motion_threshold'], args['scene_cut'], args['max_skip']) if args['motion_gate'] else None
+
+#################### Metrics ###############################
+metrics = MetricsRegistry()
+frames_read = metrics.counter('frames_read_total', 'Frames read from the source')
+failed_reads = metrics.counter('failed_reads_total', 'Reads that returned no frame before the end of the source')
+inferences = metrics.counter('inferences_total', 'Model invocations (windows run through the model)')
+skipped = metrics.counter('skipped_frames_total', 'Frames the motion gate kept from the model')
+dropped = metrics.counter('dropped_frames_total', 'Stale frames dropped by the live reader')
+stage_latency = metrics.histogram('stage_latency_seconds', 'Latency of each pipeline stage')
+queue_depth = metrics.gauge('queue_depth', 'Frames in the model window')
+writer_queue_depth = metrics.gauge('writer_queue_depth', 'Frames waiting for the video encoder')
+interpreters = metrics.gauge('interpreters', 'TFLite interpreters in use')
+interpreters.set(1)
+if args['metrics_port']:
+    metrics.serve(args['metrics_port'])
+    print(f"[INFO] Serving metrics on http://127.0.0.1:{args['metrics_port']}/metrics")
+if args['metrics_json']:
+    metrics.write_snapshots(args['metrics_json'], args['metrics_interval'])
+printer = RateLimitedPrinter(None if args['quiet'] else args['log_interval'])
 
-# Initialize recent predictions deque
-recent_predictions = deque(maxlen=100)  # Adjust the size as needed
+profiler = StageProfiler(args['profile'], args['profile_invocations'], histogram=stage_latency)
 
 while True:
-    success, img = cap.read()
+    with profiler.stage('read'):
+        success, img, img_rgb, frame_time = reader.read()
     if not success:
-        print('[INFO] Failed to read video.')
+        reached_end = 0 < reader.frame_count <= reader.frames_read
+        if reached_end:
+            print('[INFO] End of video.')
+        else:
+            failed_reads.inc()
+            print('[INFO] Failed to read video.')
         break
+    frames_read.inc()
+    timestamp = frame_time
 
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     frames_queue.append(img_rgb)
-    if len(frames_queue) == args['num_frames']:
-
-        img_to_tensor = tf.convert_to_tensor(frames_queue, dtype=tf.uint8)
-        img_resize = tf.image.resize(img_to_tensor, image_size)
-        img_norm = tf.cast(img_resize, tf.float32) / 255.
-        clips = tf.split(img_norm[tf.newaxis], img_norm.shape[0], axis=1)
-
-        # To run on a video, pass in one frame at a time
-        states = init_states
-        for clip in clips:
-            # Input shape: [1, 1, 224, 224, 3]
-            outputs = runner(**states, image=clip)
-            logits = outputs.pop('logits')[0]
-            states = outputs
-
-        probs = tf.nn.softmax(logits)
-        top_k = get_top_k(probs, k=1)
-        print(top_k[0])
-
-        # Map the label to the broader category if necessary
-        predicted_label = top_k[0][0]
-        mapped_label = label_mapping.get(predicted_label, 'other')
-        recent_predictions.append(mapped_label)
-
-        # Determine the majority label
-        label_counts = Counter(recent_predictions)
-        majority_label, majority_count = label_counts.most_common(1)[0]
-        confidence = majority_count / len(recent_predictions)
+    run_model = len(frames_queue) == args['num_frames']
+    if gate is not None:
+        run_model, scene_cut = gate.update(img_rgb, ready=run_model)
+        if scene_cut:
+            # Start a new window so the model only sees the new scene
+            frames_queue.clear()
+            frames_queue.append(img_rgb)
+        skipped.inc(gate.stats['skipped'] - skipped.value)
+    queue_depth.set(len(frames_queue))
+
+    if run_model:
+        # Frames are already at model resolution
+        with profiler.stage('invoke'):
+            probs = predict_window(runner, init_states, frames_queue)
+        profiler.invocation_done()
+        inferences.inc()
+        with profiler.stage('postprocess'):
+            category_probs = mapper(probs.numpy())
+        if early_exit is not None and early_exit.update(category_probs, reader.frames_read):
+            exited = True
+
+    # Skipped frames keep the last prediction
+    if category_probs is not None:
+        # Map to the broader category and smooth over time
+        with profiler.stage('smoothing'):
+            category, confidence = smoother.update(category_probs)
+            majority_label = mapper.categories[category]
+            timeline.add(timestamp, category, confidence)
+        if args['live']:
+            latencies.append(reader.latency())
+            stage_latency.observe('glass_to_label', latencies[-1])
+            dropped.inc(reader.dropped - dropped.value)
 
         # Display the classification
-        cv2.putText(img, f'{majority_label} {confidence:.3f}', (50, 60), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+        if args['save']:
+            cv2.putText(img, f'{majority_label} {confidence:.3f}', (50, 60), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
 
     # FPS
     c_time = time.time()
     fps_ = 1/(c_time-p_time)
     p_time = c_time
 
-    # Print FPS
-    print(f'FPS: {fps_:.2f}')
+    # Print prediction and FPS, rate-limited; top-k is only computed when printed
+    if run_model:
+        printer(lambda: f'{get_top_k(probs, k=1)[0]} FPS: {fps_:.2f}')
+    else:
+        printer(lambda: f'FPS: {fps_:.2f}')
 
     # Write Video
     if args['save']:
-        out_vid.write(img)
+        with profiler.stage('write'):
+            out_vid.write(img)
+        writer_queue_depth.set(out_vid.queue.qsize())
 
     # Display the frame (optional)
     # cv2.imshow('img', img)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
+    if exited or cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-cap.release()
+if early_exit is not None:
+    if exited:
+        decided = mapper.categories[early_exit.category]
+    else:
+        decided = mapper.categories[category] if category_probs is not None else None
+    decoded = reader.frames_read
+    # Verify on a few windows spread over the part of the file that was not decoded
+    probe_labels = []
+    last_start = reader.frame_count - args['num_frames']
+    if exited and args['probes'] > 0 and last_start > decoded:
+        for start in np.linspace(decoded, last_start, args['probes']).astype(int):
+            reader.seek(int(start))
+            window = []
+            for _ in range(args['num_frames']):
+                success, _, frame_rgb, _ = reader.read()
+                if not success:
+                    break
+                window.append(frame_rgb)
+            if len(window) == args['num_frames']:
+                probe_probs = mapper(predict_window(runner, init_states, window).numpy())
+                probe_labels.append(mapper.categories[int(np.argmax(probe_probs))])
+    processed = reader.frames_read / max(reader.frame_count, 1)
+    print(f"[INFO] Early exit: {decided} after {decoded}/{reader.frame_count} frames "
+          f"({'stable' if exited else 'end of file'}), {processed:.1%} of the file decoded")
+    if probe_labels:
+        agree = sum(label == decided for label in probe_labels)
+        print(f"[INFO] Probes agree: {agree}/{len(probe_labels)} {probe_labels}")
+
+reader.release()
 if args['save']:
     out_vid.release()
 cv2.destroyAllWindows()
+
+if args['metrics_json']:
+    metrics.dump(args['metrics_json'])
+
+if args['profile']:
+    # Short runs may end before the profiling window is full
+    profiler.save()
+    profile_tflite_ops(args['tflite'], args['profile'], args['profile_invocations'])
+
+if args['live'] and latencies:
+    lat_ms = np.array(latencies) * 1000
+    print(f"[INFO] Live: {reader.captured} frames captured, {reader.dropped} dropped; "
+          f"glass-to-label latency mean {lat_ms.mean():.1f} ms, "
+          f"p95 {np.percentile(lat_ms, 95):.1f} ms, max {lat_ms.max():.1f} ms")
+
+if gate is not None:
+    stats = gate.stats
+    print(f"[INFO] Motion gate: {stats['invocations']} inferences, {stats['skipped']} skipped "
+          f"({stats['skipped'] / max(stats['invocations'] + stats['skipped'], 1):.1%}), "
+          f"{stats['scene_cuts']} scene cuts over {stats['frames']} frames")
+
+segments = timeline.close(timestamp)
+for seg in segments:
+    print(f"[{seg['start']:8.2f}s - {seg['end']:8.2f}s] {seg['sport']} {seg['confidence']:.3f}")
+if args['timeline']:
+    timeline.save(args['timeline'])
+    print(f'[INFO] Saved timeline to : {args["timeline"]}')
+
+if cache is not None and (reached_end or exited):
+    cache.put(cache_key, {'label': dominant_sport(segments), 'segments': segments,
+                          'frames_read': reader.frames_read})
+    print(f'[INFO] Cached result under : {cache_key}')
+elif cache is not None:
+    print('[INFO] Stopped before the end of the file, result not cached')
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+
+"""
+Launches a training script as several cooperating local worker processes over loopback.
+Example:
+    python3 launch_workers.py --num_workers 4 train.py --data Dataset ... 
+The script gets --multi_worker appended and a TF_CONFIG describing the local cluster.
+"""
+
+
+ap = argparse.ArgumentParser()
+ap.add_argument("-w", "--num_workers", type=int, default=2,
+                help="number of worker processes")
+ap.add_argument("-p", "--port", type=int, default=23456,
+                help="first loopback port, workers use port..port+num_workers-1")
+ap.add_argument("--threads", type=int, default=None,
+                help="intra-op threads per worker, defaults to cpu_count/num_workers")
+ap.add_argument("script", type=str,
+                help="training script, eg: train.py")
+ap.add_argument("script_args", nargs=argparse.REMAINDER,
+                help="arguments passed on to the training script")
+args = vars(ap.parse_args())
+
+num_workers = args['num_workers']
+workers = [f'localhost:{args["port"] + i}' for i in range(num_workers)]
+threads = args['threads'] or max(1, (os.cpu_count() or 1) // num_workers)
+
+procs = []
+for index in range(num_workers):
+    env = dict(os.environ)
+    env['TF_CONFIG'] = json.dumps({'cluster': {'worker': workers},
+                                   'task': {'type': 'worker', 'index': index}})
+    # Split the cores between workers instead of every worker grabbing all of them
+    env['TF_NUM_INTRAOP_THREADS'] = str(threads)
+    env['OMP_NUM_THREADS'] = str(threads)
+    cmd = [sys.executable, args['script'], *args['script_args'], '--multi_worker']
+    print(f'[INFO] Worker {index}: {" ".join(cmd)}')
+    procs.append(subprocess.Popen(cmd, env=env))
+
+# Poll instead of waiting in order: when one worker dies, the others would block
+# forever in the collectives, so they are stopped as soon as any worker fails
+codes = [None] * num_workers
+while None in codes:
+    for index, proc in enumerate(procs):
+        if codes[index] is None:
+            codes[index] = proc.poll()
+    failed = [index for index, code in enumerate(codes) if code]
+    if failed:
+        print(f'[ERROR] Worker {failed[0]} exited with {codes[failed[0]]}, stopping the other workers')
+        for index, proc in enumerate(procs):
+            if codes[index] is None:
+                proc.terminate()
+        for index, proc in enumerate(procs):
+            if codes[index] is None:
+                try:
+                    codes[index] = proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    codes[index] = proc.wait()
+        break
+    time.sleep(0.5)
+
+for index, code in enumerate(codes):
+    if code:
+        print(f'[ERROR] Worker {index} exited with {code}')
+sys.exit(1 if any(codes) else 0)
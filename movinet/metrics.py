@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+"""
+Minimal metrics surface for long-running inference: counters, gauges and latency
+histograms, exposed as Prometheus text on a local HTTP endpoint and/or periodic
+JSON snapshots. Updates are a lock and a few additions, cheap enough for the hot loop.
+"""
+
+# Latency buckets in seconds, 1 ms to 2.5 s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name, self.help, self.kind = name, help, 'counter'
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, {}, self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    def __init__(self, name, help):
+        super().__init__(name, help)
+        self.kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    def __init__(self, name, help, label='stage', buckets=DEFAULT_BUCKETS):
+        """ Latency histogram with one series per label value (eg: per pipeline stage). """
+        self.name, self.help, self.kind = name, help, 'histogram'
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self.lock:
+            series = self.series.get(label_value)
+            if series is None:
+                series = self.series[label_value] = {'counts': [0] * len(self.buckets), 'sum': 0., 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += seconds
+            series['count'] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for label_value, series in self.series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, series['counts']):
+                    cumulative += count
+                    out.append((f'{self.name}_bucket', {self.label: label_value, 'le': bound}, cumulative))
+                out.append((f'{self.name}_bucket', {self.label: label_value, 'le': '+Inf'}, series['count']))
+                out.append((f'{self.name}_sum', {self.label: label_value}, series['sum']))
+                out.append((f'{self.name}_count', {self.label: label_value}, series['count']))
+        return out
+
+    def quantile(self, label_value, q):
+        """Bucket upper bound below which a fraction q of the observations fall, eg: '>2.5' past the last bucket."""
+        series = self.series.get(label_value)
+        if not series or not series['count']:
+            return None
+        target, cumulative = q * series['count'], 0
+        for bound, count in zip(self.buckets, series['counts']):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        # JSON has no infinity
+        return f'>{self.buckets[-1]}'
+
+    def snapshot(self):
+        with self.lock:
+            return {label_value: {'count': s['count'], 'sum': s['sum'],
+                                  'mean': s['sum'] / s['count'] if s['count'] else None,
+                                  'p50': self.quantile(label_value, 0.5),
+                                  'p99': self.quantile(label_value, 0.99)}
+                    for label_value, s in self.series.items()}
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='sport_searcher'):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(f'{self.prefix}_{name}', help))
+
+    def gauge(self, name, help):
+        return self._add(Gauge(f'{self.prefix}_{name}', help))
+
+    def histogram(self, name, help, label='stage', buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f'{self.prefix}_{name}', help, label, buckets))
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                label_str = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{name}{{{label_str}}} {value}' if label_str else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return {'time': time.time(),
+                **{name[len(self.prefix) + 1:]: metric.snapshot() for name, metric in self.metrics.items()}}
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serves /metrics in Prometheus text format from a daemon thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def write_snapshots(self, path, interval=10.):
+        """Overwrites path with a JSON snapshot every interval seconds, from a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def dump(self, path):
+        # Write to a temp file and rename, readers never see a partial snapshot
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class RateLimitedPrinter:
+    def __init__(self, interval=1.0):
+        """ Prints at most once per interval seconds; interval 0 prints everything, None nothing. """
+        self.interval = interval
+        self.last = 0.
+
+    def __call__(self, message):
+        if self.interval is None:
+            return
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            print(message() if callable(message) else message)
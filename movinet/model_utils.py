@@ -0,0 +1,132 @@
+import tensorflow as tf
+from official.projects.movinet.modeling import movinet
+from official.projects.movinet.modeling import movinet_model
+from official.projects.movinet.tools import export_saved_model
+
+
+def build_backbone(model_id, input_specs=None, use_external_states=False):
+    """
+        Builds the causal (streaming) MoViNet backbone used across training and export.
+
+        Args:
+        model_id: MoViNet variant, eg: a0, a1, a2.
+        input_specs: Optional tf.keras.layers.InputSpec for a fixed input shape.
+        use_external_states: Whether the stream states are passed in explicitly (needed for TFLite).
+
+        Return:
+        A frozen MoViNet backbone.
+    """
+    kwargs = {}
+    if input_specs is not None:
+        kwargs['input_specs'] = input_specs
+    backbone = movinet.Movinet(
+        model_id=model_id,
+        causal=True,
+        conv_type='2plus1d',
+        se_type='2plus3d',
+        activation='swish',
+        gating_activation='sigmoid',
+        use_external_states=use_external_states,
+        **kwargs)
+    backbone.trainable = False
+    return backbone
+
+
+def load_pretrained_backbone(model_id, pre_ckpt_dir):
+    """
+        Builds the backbone and restores the Kinetics-600 pre-trained weights into it.
+
+        Args:
+        model_id: MoViNet variant, must match the checkpoint.
+        pre_ckpt_dir: Dir of the downloaded model zoo checkpoint, eg: movinet_a2_stream/.
+
+        Return:
+        The frozen, pre-trained backbone.
+    """
+    backbone = build_backbone(model_id)
+    # Set num_classes=600 to load the pre-trained weights from the original model
+    model = movinet_model.MovinetClassifier(backbone, num_classes=600)
+    model.build([1, 1, 1, 1, 3])
+    checkpoint_path = tf.train.latest_checkpoint(pre_ckpt_dir)
+    checkpoint = tf.train.Checkpoint(model=model)
+    status = checkpoint.restore(checkpoint_path)
+    status.assert_existing_objects_matched()
+    return backbone
+
+
+def build_classifier(batch_size, num_frames, resolution, backbone, num_classes, freeze_backbone=False):
+    """Builds a classifier on top of a backbone model."""
+    model = movinet_model.MovinetClassifier(
+        backbone=backbone,
+        num_classes=num_classes)
+    model.build([batch_size, num_frames, resolution, resolution, 3])
+
+    return model
+
+
+def load_classifier(ckpt_path, model_id, num_classes, num_frames, resolution, batch_size=1):
+    """
+        Rebuilds the fine-tuned classifier and restores the weights saved by train.py.
+
+        Args:
+        ckpt_path: Path given to train.py as --save_ckpt.
+        model_id: MoViNet variant the checkpoint was trained with.
+        num_classes: Number of output classes.
+        num_frames: Number of frames per clip.
+        resolution: Input resolution.
+        batch_size: Batch size used to build the model.
+
+        Return:
+        The restored tf.keras classifier.
+    """
+    backbone = build_backbone(model_id)
+    model = build_classifier(batch_size, num_frames, resolution, backbone, num_classes)
+    model.load_weights(ckpt_path).expect_partial()
+    return model
+
+
+def export_stream_tflite(weights, model_id, num_classes, resolution, saved_model_dir, tflite_path, precision=32):
+    """
+        Exports a trained classifier as a streaming (one frame per call) TFLite model.
+
+        Args:
+        weights: Weights of the trained classifier (model.get_weights()).
+        model_id: MoViNet variant of the classifier.
+        num_classes: Number of output classes.
+        resolution: Input resolution of the exported model.
+        saved_model_dir: Dir for the intermediate SavedModel.
+        tflite_path: Path to write the tflite model to.
+        precision: 32 or 16 (float16 weights).
+
+        Return:
+        Size of the tflite model in bytes.
+    """
+    input_shape = [1, 1, resolution, resolution, 3]
+
+    tf.keras.backend.clear_session()
+    input_specs = tf.keras.layers.InputSpec(shape=input_shape)
+    stream_backbone = build_backbone(model_id, input_specs=input_specs, use_external_states=True)
+    stream_model = movinet_model.MovinetClassifier(
+        backbone=stream_backbone,
+        num_classes=num_classes,
+        output_states=True)
+    stream_model.build(input_shape)
+    stream_model.set_weights(weights)
+
+    export_saved_model.export_saved_model(
+        model=stream_model,
+        input_shape=input_shape,
+        export_path=saved_model_dir,
+        causal=True,
+        bundle_input_init_states_fn=False)
+    print(f'[INFO] Exported model: {saved_model_dir}')
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    if precision == 16:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    tflite_model = converter.convert()
+    with open(tflite_path, 'wb') as f:
+        f.write(tflite_model)
+    print(f'[INFO] Saved TFLite model to : {tflite_path}')
+    return len(tflite_model)
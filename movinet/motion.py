@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(self, motion_threshold=2.0, scene_cut_threshold=40.0, max_skip=150, size=64):
+        """ Cheap frame-differencing gate deciding when the model needs to run.
+
+        Args:
+            motion_threshold: Mean absolute gray difference (0-255) since the last
+                inference below which the scene counts as static.
+            scene_cut_threshold: Mean absolute gray difference to the previous frame
+                above which the frame counts as a scene cut.
+            max_skip: Force an inference after this many skipped frames (0 disables).
+            size: Side of the grayscale thumbnail that is compared.
+        """
+        self.motion_threshold = motion_threshold
+        self.scene_cut_threshold = scene_cut_threshold
+        self.max_skip = max_skip
+        self.size = size
+        self.reference = None
+        self.previous = None
+        self.skipped_in_row = 0
+        self.stats = {'frames': 0, 'invocations': 0, 'skipped': 0, 'scene_cuts': 0}
+
+    def thumbnail(self, img_rgb):
+        small = cv2.resize(img_rgb, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY).astype(np.int16)
+
+    def update(self, img_rgb, ready=True):
+        """
+            Compares the frame with the previous one and the one used for the last inference.
+
+            Args:
+            img_rgb: RGB frame at model resolution.
+            ready: Whether the model could run on this frame (frame window is full).
+
+            Return:
+            (run_model, scene_cut), run_model is always False on a scene cut
+        """
+        thumb = self.thumbnail(img_rgb)
+        self.stats['frames'] += 1
+        scene_cut = bool(self.previous is not None and
+                         np.abs(thumb - self.previous).mean() > self.scene_cut_threshold)
+        self.previous = thumb
+        if scene_cut:
+            self.stats['scene_cuts'] += 1
+            # The caller restarts the frame window on a cut, so there is nothing to run yet;
+            # with no reference, the first full window after the cut gets a fresh inference
+            self.reference = None
+            return False, True
+        if not ready:
+            return False, False
+
+        static = (self.reference is not None and
+                  np.abs(thumb - self.reference).mean() < self.motion_threshold)
+        if static and not (self.max_skip and self.skipped_in_row >= self.max_skip):
+            self.skipped_in_row += 1
+            self.stats['skipped'] += 1
+            return False, scene_cut
+
+        self.reference = thumb
+        self.skipped_in_row = 0
+        self.stats['invocations'] += 1
+        return True, scene_cut
@@ -0,0 +1,265 @@
+import json
+from collections import deque
+import numpy as np
+
+
+# Define label mapping
+label_mapping = {
+    'BaseballPitch': 'baseball',
+    'CricketBowling': 'cricket',
+    'CricketShot': 'cricket',
+    'SoccerJuggling': 'soccer',
+    'SoccerPenalty': 'soccer',
+}
+
+
+class CategoryMapper:
+    def __init__(self, label_map, label_mapping=label_mapping, default='other'):
+        """ Folds model class probabilities into the broader sport categories.
+
+        Args:
+            label_map: Model class names, in output order.
+            label_mapping: Dict of class name -> sport category.
+            default: Category for classes missing from label_mapping.
+        """
+        mapped = [label_mapping.get(label, default) for label in label_map]
+        self.categories = sorted(set(mapped))
+        index = {name: idx for idx, name in enumerate(self.categories)}
+        self.class_to_category = np.array([index[name] for name in mapped])
+
+    def __call__(self, probs):
+        category_probs = np.zeros(len(self.categories), dtype=np.float32)
+        np.add.at(category_probs, self.class_to_category, np.asarray(probs, dtype=np.float32))
+        return category_probs
+
+
+class MajoritySmoother:
+    def __init__(self, num_categories, window=100):
+        """ Sliding-window majority vote over top-1 categories, with running counts.
+
+        Args:
+            num_categories: Number of sport categories.
+            window: Number of recent predictions to vote over.
+        """
+        self.recent = deque(maxlen=window)
+        self.counts = np.zeros(num_categories, dtype=np.int64)
+        self.best = 0
+
+    def update(self, probs):
+        idx = int(np.argmax(probs))
+        if len(self.recent) == self.recent.maxlen:
+            old = self.recent[0]
+            self.counts[old] -= 1
+            if old == self.best:
+                # Only rescan when the leader lost a vote
+                self.best = int(np.argmax(self.counts))
+        self.recent.append(idx)
+        self.counts[idx] += 1
+        if self.counts[idx] > self.counts[self.best]:
+            self.best = idx
+        return self.best, float(self.counts[self.best] / len(self.recent))
+
+
+class EmaSmoother:
+    def __init__(self, num_categories, alpha=0.1):
+        """ Exponential moving average of category probabilities.
+
+        Args:
+            num_categories: Number of sport categories.
+            alpha: Weight of the newest prediction, 0<alpha<=1.
+        """
+        self.alpha = alpha
+        self.ema = None
+
+    def update(self, probs):
+        probs = np.asarray(probs, dtype=np.float32)
+        if self.ema is None:
+            self.ema = probs.copy()
+        else:
+            self.ema += self.alpha * (probs - self.ema)
+        best = int(np.argmax(self.ema))
+        return best, float(self.ema[best])
+
+
+class HysteresisSmoother:
+    def __init__(self, num_categories, alpha=0.1, margin=0.1, min_frames=30):
+        """ Switches category only when a challenger wins clearly for long enough.
+
+        Args:
+            num_categories: Number of sport categories.
+            alpha: EMA weight applied before the switching rule.
+            margin: How much the challenger must beat the current category by.
+            min_frames: Number of consecutive frames the challenger must hold.
+        """
+        self.ema = EmaSmoother(num_categories, alpha)
+        self.margin = margin
+        self.min_frames = min_frames
+        self.current = None
+        self.candidate = None
+        self.held = 0
+
+    def update(self, probs):
+        best, _ = self.ema.update(probs)
+        probs = self.ema.ema
+        if self.current is None:
+            self.current = best
+        elif best != self.current and probs[best] - probs[self.current] >= self.margin:
+            if best != self.candidate:
+                self.candidate, self.held = best, 0
+            self.held += 1
+            if self.held >= self.min_frames:
+                self.current, self.candidate, self.held = best, None, 0
+        else:
+            self.candidate, self.held = None, 0
+        return self.current, float(probs[self.current])
+
+
+class EarlyExit:
+    def __init__(self, min_frames=64, margin=0.3, patience=10, spacing=8):
+        """ Decides when a whole-file classification is settled and decoding can stop.
+
+        Args:
+            min_frames: Minimum number of frames read before stopping.
+            margin: Minimum gap between the top two category probabilities of a window.
+            patience: Number of consecutive confident windows that must agree.
+            spacing: Frames between two counted windows; with the window length, the
+                counted windows do not overlap and each one sees new frames.
+        """
+        self.min_frames = min_frames
+        self.margin = margin
+        self.patience = patience
+        self.spacing = spacing
+        self.category = None
+        self.agreeing = 0
+        self.last_counted = None
+
+    def update(self, probs, frames_read):
+        """Returns True once the prediction is stable enough to stop."""
+        # Sliding windows share all but one frame, only every spacing-th frame gets a vote
+        if self.last_counted is not None and frames_read - self.last_counted < self.spacing:
+            return False
+        self.last_counted = frames_read
+        top2 = np.sort(probs)[-2:] if len(probs) > 1 else np.array([0., probs[0]])
+        category = int(np.argmax(probs))
+        if top2[1] - top2[0] < self.margin:
+            self.agreeing = 0
+        elif category == self.category:
+            self.agreeing += 1
+        else:
+            self.category, self.agreeing = category, 1
+        return frames_read >= self.min_frames and self.agreeing >= self.patience
+
+
+smoothers = {
+    'majority': MajoritySmoother,
+    'ema': EmaSmoother,
+    'hysteresis': HysteresisSmoother,
+}
+
+
+def build_smoother(mode, num_categories, window=100, alpha=0.1, margin=0.1, min_frames=30):
+    """Builds the smoother for --smoothing, only passing the options the mode uses."""
+    kwargs = {
+        'majority': {'window': window},
+        'ema': {'alpha': alpha},
+        'hysteresis': {'alpha': alpha, 'margin': margin, 'min_frames': min_frames},
+    }[mode]
+    return smoothers[mode](num_categories, **kwargs)
+
+
+class SegmentTimeline:
+    def __init__(self, categories):
+        """ Collapses per-frame smoothed labels into (start, end, sport, confidence) segments.
+
+        Args:
+            categories: Sport category names, indexed by the smoother output.
+        """
+        self.categories = categories
+        self.segments = []
+        self._current = None
+
+    def add(self, timestamp, category, confidence):
+        seg = self._current
+        if seg is not None and seg['category'] == category:
+            seg['end'] = timestamp
+            seg['conf_sum'] += confidence
+            seg['count'] += 1
+            return
+        if seg is not None:
+            seg['end'] = timestamp
+            self.segments.append(seg)
+        self._current = {'start': timestamp, 'end': timestamp, 'category': category,
+                         'conf_sum': confidence, 'count': 1}
+
+    def close(self, timestamp=None):
+        if self._current is not None:
+            if timestamp is not None:
+                self._current['end'] = max(self._current['end'], timestamp)
+            self.segments.append(self._current)
+            self._current = None
+        return self.to_list()
+
+    def to_list(self):
+        return [{
+            'start': round(seg['start'], 3),
+            'end': round(seg['end'], 3),
+            'sport': self.categories[seg['category']],
+            'confidence': round(seg['conf_sum'] / seg['count'], 4),
+        } for seg in self.segments]
+
+    def save(self, path):
+        save_segments(self.to_list(), path)
+
+
+def save_segments(segments, path):
+    """Saves a timeline as JSON, or as a WebVTT subtitle track for .vtt paths."""
+    with open(path, 'w') as f:
+        if path.lower().endswith('.vtt'):
+            f.write(to_webvtt(segments))
+        else:
+            json.dump(segments, f, indent=2)
+
+
+def dominant_sport(segments):
+    """Sport covering the most time of the timeline, used as the per-video label."""
+    durations = {}
+    for seg in segments:
+        durations[seg['sport']] = durations.get(seg['sport'], 0.) + seg['end'] - seg['start']
+    return max(durations, key=durations.get) if durations else None
+
+
+def format_vtt_time(seconds):
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    secs, ms = divmod(ms, 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d}.{ms:03d}'
+
+
+def to_webvtt(segments):
+    """Renders segments as WebVTT cues so the player can draw the overlay."""
+    lines = ['WEBVTT', '']
+    for i, seg in enumerate(segments, 1):
+        lines += [str(i),
+                  f"{format_vtt_time(seg['start'])} --> {format_vtt_time(seg['end'])}",
+                  f"{seg['sport']} {seg['confidence']:.3f}",
+                  '']
+    return '\n'.join(lines)
+
+
+def merge_segments(segment_lists):
+    """Joins ordered per-chunk timelines, fusing same-sport segments across chunk borders."""
+    merged = []
+    for segments in segment_lists:
+        for seg in segments:
+            prev = merged[-1] if merged else None
+            if prev is not None and prev['sport'] == seg['sport']:
+                prev_len, seg_len = prev['end'] - prev['start'], seg['end'] - seg['start']
+                total = prev_len + seg_len
+                if total > 0:
+                    prev['confidence'] = round((prev['confidence'] * prev_len +
+                                                seg['confidence'] * seg_len) / total, 4)
+                prev['end'] = max(prev['end'], seg['end'])
+            else:
+                merged.append(dict(seg))
+    return merged
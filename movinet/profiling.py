@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import shutil
+import subprocess
+from contextlib import contextmanager
+from collections import defaultdict
+import numpy as np
+
+
+def training_profiler_callback(run_dir, profile_steps='10,15'):
+    """
+        TensorBoard callback capturing a bounded TensorFlow profiler trace of training steps.
+        The trace holds the step timeline and the input pipeline analysis (time waiting on
+        tf.data vs. device compute), open it with the Profile tab of TensorBoard.
+
+        Args:
+        run_dir: Dir the trace is written to.
+        profile_steps: 'first,last' training step of the trace window.
+
+        Return:
+        A tf.keras.callbacks.TensorBoard callback.
+    """
+    import tensorflow as tf
+
+    first, last = (int(step) for step in profile_steps.split(','))
+    return tf.keras.callbacks.TensorBoard(log_dir=run_dir, profile_batch=(first, last),
+                                          histogram_freq=0, write_graph=False)
+
+
+class StageProfiler:
+    def __init__(self, run_dir=None, max_invocations=100, histogram=None):
+        """ Times the stages of the inference loop for a bounded number of model invocations.
+
+        Args:
+            run_dir: Dir the report is written to, None disables profiling.
+            max_invocations: Number of model invocations to record.
+            histogram: Optional metrics.Histogram every stage timing is also observed into, unbounded.
+        """
+        self.histogram = histogram
+        self.run_dir = run_dir
+        self.enabled = run_dir is not None
+        self.max_invocations = max_invocations
+        self.invocations = 0
+        self.times = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled and self.histogram is None:
+            yield
+            return
+        t0 = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - t0
+        if self.enabled:
+            self.times[name].append(elapsed)
+        if self.histogram is not None:
+            self.histogram.observe(name, elapsed)
+
+    def invocation_done(self):
+        """Counts a model invocation, stops recording once the window is full."""
+        if not self.enabled:
+            return
+        self.invocations += 1
+        if self.invocations >= self.max_invocations:
+            self.enabled = False
+            self.save()
+
+    def report(self):
+        total = sum(sum(t) for t in self.times.values()) or 1.
+        return {
+            name: {
+                'count': len(t),
+                'mean_ms': float(np.mean(t) * 1000),
+                'p50_ms': float(np.percentile(t, 50) * 1000),
+                'p95_ms': float(np.percentile(t, 95) * 1000),
+                'total_s': float(np.sum(t)),
+                'share': float(np.sum(t) / total),
+            } for name, t in self.times.items() if t
+        }
+
+    def save(self):
+        if self.run_dir is None or not self.times:
+            return
+        os.makedirs(self.run_dir, exist_ok=True)
+        report = self.report()
+        path = os.path.join(self.run_dir, 'stages.json')
+        with open(path, 'w') as f:
+            json.dump({'invocations': self.invocations, 'stages': report}, f, indent=2)
+        print(f'[INFO] Stage profile ({self.invocations} invocations):')
+        for name, stats in sorted(report.items(), key=lambda item: -item[1]['share']):
+            print(f"  {name:<12} mean {stats['mean_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  {stats['share']:6.1%}")
+        print(f'[INFO] Saved stage profile to : {path}')
+        self.times.clear()
+
+
+def profile_tflite_ops(tflite_path, run_dir, num_runs=100, num_threads=-1):
+    """
+        Writes a per-op profile of a tflite model to run_dir/ops.txt.
+
+        The Python interpreter has no op-level timers, so this drives TFLite's
+        benchmark_model tool (looked up on PATH or in $TFLITE_BENCHMARK_MODEL) with
+        op profiling enabled. Without the tool, or when it fails, only the op inventory is written.
+
+        Args:
+        tflite_path: Path to the tflite model.
+        run_dir: Dir the report is written to.
+        num_runs: Number of invocations to profile.
+        num_threads: Interpreter threads, -1 for the TFLite default.
+
+        Return:
+        Path of the report.
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    path = os.path.join(run_dir, 'ops.txt')
+    tool = os.environ.get('TFLITE_BENCHMARK_MODEL') or shutil.which('benchmark_model')
+    note = 'benchmark_model not found (set $TFLITE_BENCHMARK_MODEL), op timings unavailable.'
+    if tool:
+        cmd = [tool, f'--graph={tflite_path}', f'--num_runs={num_runs}',
+               f'--num_threads={num_threads}', '--enable_op_profiling=true']
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        output = ' '.join(cmd) + '\n\n' + result.stdout + result.stderr
+        if result.returncode == 0:
+            with open(path, 'w') as f:
+                f.write(output)
+            print(f'[INFO] Saved op profile to : {path}')
+            return path
+        # Keep the failed run's output apart, ops.txt only ever holds a profile or the inventory
+        log_path = os.path.join(run_dir, 'benchmark_model.log')
+        with open(log_path, 'w') as f:
+            f.write(output)
+        print(f'[ERROR] benchmark_model exited with {result.returncode}, see {log_path}')
+        note = f'benchmark_model failed (exit {result.returncode}, see benchmark_model.log), op timings unavailable.'
+
+    import tensorflow as tf
+
+    interpreter = tf.lite.Interpreter(model_path=tflite_path)
+    try:
+        # Private API, may be missing or changed in other TensorFlow versions
+        ops = interpreter._get_ops_details()
+        counts = defaultdict(int)
+        for op in ops:
+            counts[op['op_name']] += 1
+    except (AttributeError, KeyError, TypeError):
+        ops = None
+    with open(path, 'w') as f:
+        f.write(note + '\n')
+        if ops is None:
+            f.write('Op inventory unavailable in this TensorFlow version.\n')
+        else:
+            f.write(f'{len(ops)} ops:\n')
+            for name, count in sorted(counts.items(), key=lambda item: -item[1]):
+                f.write(f'  {name:<32} {count}\n')
+    print(f'[INFO] Saved op profile to : {path}')
+    return path
@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+
+def fingerprint_file(path, chunk_size=1 << 20, num_chunks=8):
+    """
+        Fast content fingerprint: file size plus a hash of evenly spaced chunks.
+
+        Args:
+        path: File path.
+        chunk_size: Bytes read per chunk.
+        num_chunks: Number of chunks sampled, including the first and the last one.
+
+        Return:
+        Hex digest identifying the content.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        if size <= chunk_size * num_chunks:
+            digest.update(f.read())
+        else:
+            step = (size - chunk_size) // (num_chunks - 1)
+            for i in range(num_chunks):
+                f.seek(i * step)
+                digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    """Full content hash, used for model artifacts."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def exclusive_lock(path):
+    """Holds an exclusive lock on path across processes, fcntl on POSIX and msvcrt on Windows."""
+    with open(path, 'a') as f:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            while True:
+                try:
+                    # LK_LOCK gives up after 10 s, keep waiting like flock does
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+            try:
+                yield
+            finally:
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes=512 << 20):
+        """ On-disk, size-bounded LRU cache of per-video results, safe to share between processes.
+
+        Args:
+            cache_dir: Directory holding the cache entries.
+            max_bytes: Disk budget, least recently used entries are evicted above it.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(video_fingerprint, model_hash, params):
+        payload = json.dumps({'video': video_fingerprint, 'model': model_hash, 'params': params},
+                             sort_keys=True)
+        return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            # mtime doubles as the LRU timestamp
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return result
+
+    def put(self, key, result):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename, readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits its budget."""
+        with exclusive_lock(os.path.join(self.cache_dir, '.lock')):
+            entries, total = [], 0
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if not name.endswith('.json'):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
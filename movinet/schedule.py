@@ -0,0 +1,41 @@
+"""
+Progressive training schedule: early epochs train on smaller, shorter clips
+(cheap, enough to fit the new head), later epochs step up to the target size.
+The spec lists the early stages as epochs:resolution:num_frames, eg: '3:112:8,3:172:16';
+the remaining epochs run at the target --resolution/--num_frames.
+"""
+
+
+def parse_schedule(spec, num_epochs, resolution, num_frames, batch_size, max_batch_scale=4):
+    """
+        Turns a schedule spec into training stages.
+
+        Args:
+        spec: Schedule spec, None or '' for a single full-size stage.
+        num_epochs: Total number of epochs.
+        resolution: Target resolution.
+        num_frames: Target number of frames.
+        batch_size: Batch size at the target size.
+        max_batch_scale: Cap on how much larger the batch of a small stage may get.
+
+        Return:
+        List of dicts with epochs, resolution, num_frames, batch_size and final (target size) keys.
+    """
+    stages = []
+    for entry in (spec or '').split(','):
+        if not entry.strip():
+            continue
+        epochs, res, frames = (int(v) for v in entry.split(':'))
+        if res > resolution or frames > num_frames:
+            raise ValueError(f'stage {entry} is larger than the target {resolution}px x {num_frames} frames')
+        # Keep pixels per step about constant, so the smaller clips use the same memory
+        scale = min((resolution ** 2 * num_frames) / (res ** 2 * frames), max_batch_scale)
+        stages.append({'epochs': epochs, 'resolution': res, 'num_frames': frames,
+                       'batch_size': max(1, int(batch_size * scale)), 'final': False})
+
+    remaining = num_epochs - sum(stage['epochs'] for stage in stages)
+    if remaining < 1:
+        raise ValueError(f'schedule {spec} leaves no epoch at the target size out of {num_epochs}')
+    stages.append({'epochs': remaining, 'resolution': resolution, 'num_frames': num_frames,
+                   'batch_size': batch_size, 'final': True})
+    return stages
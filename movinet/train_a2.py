@@ -1,10 +1,19 @@
 import os
+import sys
+import time
 import tensorflow as tf
 from official.projects.movinet.modeling import movinet
 from official.projects.movinet.modeling import movinet_model
-from official.projects.movinet.tools import export_saved_model
 import pathlib
 from utils import FrameGenerator
+from model_utils import build_classifier, export_stream_tflite
+from compression import MagnitudePruning, WeightClustering, compressible_variables, sparsity_of
+from compression import print_comparison, tflite_stats
+from bundle import write_bundle
+from profiling import training_profiler_callback
+from schedule import parse_schedule
+from distributed import distributed_dataset, get_strategy, is_chief
+from postprocess import label_mapping
 import argparse
 
 
@@ -32,7 +41,32 @@ ap.add_argument("-o", "--save", type=str, required=True,
 ap.add_argument("-f", "--float", type=int, default=32,
                 choices=[32, 16],
                 help="model quantization")
+ap.add_argument("--prune", type=float, default=0.,
+                help="target sparsity of magnitude pruning before export, eg: 0.5 (0 disables)")
+ap.add_argument("--cluster", type=int, default=0,
+                help="number of weight clusters before export, eg: 16 (0 disables)")
+ap.add_argument("--compress_epochs", type=int, default=2,
+                help="fine-tuning epochs for pruning/clustering")
+ap.add_argument("--profile", type=str, default=None,
+                help="run dir for a TensorFlow profiler trace of training steps")
+ap.add_argument("--profile_steps", type=str, default='10,15',
+                help="first,last training step of the profiler trace window")
+ap.add_argument("--schedule", type=str, default=None,
+                help="progressive stages before the full-size epochs, epochs:resolution:num_frames, eg: 3:112:8,3:172:16")
+ap.add_argument("--multi_worker", action='store_true',
+                help="data-parallel training across worker processes configured by TF_CONFIG (see launch_workers.py)")
 args = vars(ap.parse_args())
+if args['multi_worker'] and (args['prune'] > 0 or args['cluster'] > 0):
+    sys.exit('[ERROR] --prune/--cluster run in a single process, drop --multi_worker')
+
+try:
+    stages = parse_schedule(args['schedule'], args['num_epochs'], args['resolution'],
+                            args['num_frames'], args['batch_size'])
+except ValueError as e:
+    sys.exit(f'[ERROR] {e}')
+
+# Must be created before any other TensorFlow op
+strategy = get_strategy(args['multi_worker'])
 
 
 # Load Data
@@ -64,121 +98,164 @@ path_save_tflite = args['save']
 output_signature = (tf.TensorSpec(shape = (None, None, None, 3), dtype = tf.float32),
                     tf.TensorSpec(shape = (), dtype = tf.int16))
 
-train_ds = tf.data.Dataset.from_generator(FrameGenerator(subset_paths['train'], num_frames, training = True),
+image_shape = (resolution, resolution)
+train_generator = FrameGenerator(subset_paths['train'], num_frames, training = True, output_size = image_shape)
+train_ds = tf.data.Dataset.from_generator(train_generator,
                                           output_signature = output_signature)
 train_ds = train_ds.batch(batch_size)
 
-test_ds = tf.data.Dataset.from_generator(FrameGenerator(subset_paths['test'], num_frames),
+test_ds = tf.data.Dataset.from_generator(FrameGenerator(subset_paths['test'], num_frames, output_size = image_shape),
                                          output_signature = output_signature)
 test_ds = test_ds.batch(batch_size)
 
-for frames, labels in train_ds.take(10):
-    print(labels)
+fit_kwargs = {}
+if args['multi_worker']:
+    # batch_size is the global batch, split over the workers
+    train_ds, steps_per_epoch = distributed_dataset(subset_paths['train'], num_frames, batch_size,
+                                                    output_signature, training = True, output_size = image_shape)
+    test_ds, validation_steps = distributed_dataset(subset_paths['test'], num_frames, batch_size,
+                                                    output_signature, output_size = image_shape)
+    fit_kwargs = {'steps_per_epoch': steps_per_epoch, 'validation_steps': validation_steps}
 
-print(f"Shape: {frames.shape}")
-print(f"Label: {labels.shape}")
+# Per-clip shapes from the signature, without decoding batches just to print them
+# (use benchmark_train.py to measure the input pipeline)
+print(f"Shape: {output_signature[0].shape}")
+print(f"Label: {output_signature[1].shape}")
 
 
 tf.keras.backend.clear_session()
 
-backbone = movinet.Movinet(
-    model_id=model_id,
-    causal=True,
-    conv_type='2plus1d',
-    se_type='2plus3d',
-    activation='swish',
-    gating_activation='sigmoid'
-)
-backbone.trainable = False
-
-# Set num_classes=600 to load the pre-trained weights from the original model
-model = movinet_model.MovinetClassifier(
-    backbone, num_classes=600)
-model.build([1, 1, 1, 1, 3])
-
-# Load pre-trained weights, be sure you change de model id
-# !wget https://storage.googleapis.com/tf_model_garden/vision/movinet/movinet_a1_stream.tar.gz -O movinet_a1_stream.tar.gz -q
-# !tar -xvf movinet_a1_stream.tar.gz
-
-checkpoint_path = tf.train.latest_checkpoint(pre_ckpt_dir)
-checkpoint = tf.train.Checkpoint(model=model)
-status = checkpoint.restore(checkpoint_path)
-status.assert_existing_objects_matched()
-
-def build_classifier(batch_size, num_frames, resolution, backbone, num_classes, freeze_backbone=False):
-    """Builds a classifier on top of a backbone model."""
+# Variables are created under the strategy, so they are mirrored across workers
+with strategy.scope():
+    backbone = movinet.Movinet(
+        model_id=model_id,
+        causal=True,
+        conv_type='2plus1d',
+        se_type='2plus3d',
+        activation='swish',
+        gating_activation='sigmoid'
+    )
+    backbone.trainable = False
+
+    # Set num_classes=600 to load the pre-trained weights from the original model
     model = movinet_model.MovinetClassifier(
-        backbone=backbone,
-        num_classes=num_classes)
-    model.build([batch_size, num_frames, resolution, resolution, 3])
+        backbone, num_classes=600)
+    model.build([1, 1, 1, 1, 3])
 
-    return model
+    # Load pre-trained weights, be sure you change de model id
+    # !wget https://storage.googleapis.com/tf_model_garden/vision/movinet/movinet_a1_stream.tar.gz -O movinet_a1_stream.tar.gz -q
+    # !tar -xvf movinet_a1_stream.tar.gz
 
-# Build Model
-model = build_classifier(batch_size, num_frames, resolution, backbone, num_classes)
-loss_obj = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
-optimizer = tf.keras.optimizers.Adam(learning_rate = 0.0001)
-model.compile(loss=loss_obj, optimizer=optimizer, metrics=['accuracy'])
+    checkpoint_path = tf.train.latest_checkpoint(pre_ckpt_dir)
+    checkpoint = tf.train.Checkpoint(model=model)
+    status = checkpoint.restore(checkpoint_path)
+    status.assert_existing_objects_matched()
+
+    # Build Model
+    model = build_classifier(batch_size, num_frames, resolution, backbone, num_classes)
+    loss_obj = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
+    optimizer = tf.keras.optimizers.Adam(learning_rate = 0.0001)
+    model.compile(loss=loss_obj, optimizer=optimizer, metrics=['accuracy'])
 
 # Callback
+# Under the multi-worker strategy Keras writes non-chief copies to temp dirs and removes them
 cp_callback = tf.keras.callbacks.ModelCheckpoint(filepath=save_ckpt_dir,
                                                  save_weights_only=True,
                                                  verbose=1,)
 
+callbacks = [cp_callback]
+if args['profile'] and is_chief():
+    callbacks.append(training_profiler_callback(args['profile'], args['profile_steps']))
+
 print('Number of Classes: ', num_classes)
 print('Total Number of Epochs: ', num_epochs)
 print('Batch Size: ', batch_size)
 
-results = model.fit(train_ds,
-                    validation_data=test_ds,
-                    epochs=num_epochs,
-                    validation_freq=1,
-                    callbacks=[cp_callback],
-                    verbose=1)
+def stage_datasets(stage):
+    """Train dataset and fit kwargs of a progressive stage, validation stays at full size."""
+    if stage['final']:
+        return train_ds, fit_kwargs
+    size = (stage['resolution'], stage['resolution'])
+    if args['multi_worker']:
+        stage_ds, steps = distributed_dataset(subset_paths['train'], stage['num_frames'], stage['batch_size'],
+                                              output_signature, training = True, output_size = size)
+        return stage_ds, {**fit_kwargs, 'steps_per_epoch': steps}
+    stage_ds = tf.data.Dataset.from_generator(
+        FrameGenerator(subset_paths['train'], stage['num_frames'], training = True, output_size = size),
+        output_signature = output_signature)
+    return stage_ds.batch(stage['batch_size']), fit_kwargs
 
-print(results.history)
+history = {}
+epoch = 0
+for stage in stages:
+    if len(stages) > 1:
+        print(f"[INFO] Stage: {stage['epochs']} epochs at {stage['resolution']}px x "
+              f"{stage['num_frames']} frames, batch {stage['batch_size']}")
+    stage_ds, stage_kwargs = stage_datasets(stage)
+    t0 = time.time()
+    results = model.fit(stage_ds,
+                        validation_data=test_ds,
+                        initial_epoch=epoch,
+                        epochs=epoch + stage['epochs'],
+                        validation_freq=1,
+                        callbacks=callbacks,
+                        verbose=1,
+                        **stage_kwargs)
+    epoch += stage['epochs']
+    for key, values in results.history.items():
+        history.setdefault(key, []).extend(values)
+    if len(stages) > 1:
+        print(f'[INFO] Stage took {time.time() - t0:.1f}s')
 
-weights=model.get_weights()
-input_shape = [1, 1, 224, 224, 3]
-batch_size, num_frames, image_size, = input_shape[:3]
+print(history)
 
-tf.keras.backend.clear_session()
-# Create the model
-input_specs = tf.keras.layers.InputSpec(shape=input_shape)
-stream_backbone = movinet.Movinet(
-    model_id='a2',
-    causal=True,
-    input_specs=input_specs,
-    conv_type='2plus1d',
-    se_type='2plus3d',
-    activation='swish',
-    gating_activation='sigmoid',
-    use_external_states=True)
-stream_backbone.trainable=False
-stream_model = movinet_model.MovinetClassifier(
-    backbone=stream_backbone,
-    num_classes=num_classes,
-    output_states=True)
-stream_model.build([1, 1, 172, 172, 3])
-stream_model.set_weights(weights)
-stream_model.get_weights()[0] 
-model.get_weights()[0]
-
-# Export Model
-export_saved_model.export_saved_model(
-    model=stream_model,
-    input_shape=input_shape,
-    export_path=saved_model_dir,
-    causal=True,
-    bundle_input_init_states_fn=False)
-print(f'[INFO] Exported model: {saved_model_dir}')
-
-# To TFLite
-converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
-if args['float'] == 16:
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-    converter.target_spec.supported_types = [tf.float16]
-tflite_model = converter.convert()
-with open(path_save_tflite, 'wb') as f:
-    f.write(tflite_model)
-print(f'[INFO] Saved TFLite model to : {path_save_tflite}')
+# Export is done by the chief only
+if not is_chief():
+    sys.exit(0)
+
+dense_weights = model.get_weights()
+image_size = 224
+
+# Optional pruning / clustering fine-tuning before export
+compress = args['prune'] > 0 or args['cluster'] > 0
+if compress:
+    dense_eval = model.evaluate(test_ds, return_dict=True, verbose=0)
+    variables = compressible_variables(model)
+    compress_callbacks = []
+    steps_per_epoch = -(-len(train_generator.get_files_and_class_names()[0]) // batch_size)
+    if args['prune'] > 0:
+        # Reach the target sparsity halfway, then let the remaining weights recover
+        compress_callbacks.append(MagnitudePruning(variables, args['prune'],
+                                                   end_step=steps_per_epoch * args['compress_epochs'] // 2))
+    if args['cluster'] > 0:
+        clustering = WeightClustering(variables, args['cluster'])
+        clustering.apply()
+        compress_callbacks.append(clustering)
+    # Checkpoint last, after the masks and centroids of the epoch are applied
+    compress_callbacks.append(cp_callback)
+    model.fit(train_ds,
+              epochs=args['compress_epochs'],
+              callbacks=compress_callbacks,
+              verbose=1)
+    compressed_eval = model.evaluate(test_ds, return_dict=True, verbose=0)
+    print(f'[INFO] Compressed weights sparsity: {sparsity_of(variables):.2%}')
+weights = model.get_weights()
+
+# Export Model and convert to TFLite
+export_stream_tflite(weights, 'a2', num_classes, image_size, saved_model_dir, path_save_tflite, args['float'])
+
+if compress:
+    # Dense baseline next to the compressed model, for comparison
+    stem, ext = os.path.splitext(path_save_tflite)
+    path_dense_tflite = f'{stem}_dense{ext}'
+    export_stream_tflite(dense_weights, 'a2', num_classes, image_size,
+                         saved_model_dir.rstrip('/') + '_dense', path_dense_tflite, args['float'])
+    dense_stats = {'accuracy': dense_eval['accuracy'], **tflite_stats(path_dense_tflite)}
+    compressed_stats = {'accuracy': compressed_eval['accuracy'], **tflite_stats(path_save_tflite)}
+    print_comparison(dense_stats, compressed_stats)
+
+# Bundle metadata, so inference does not need the dataset dir
+bundle_file = write_bundle(path_save_tflite, train_generator.class_names, label_mapping,
+                           model_id='a2', resolution=image_size, num_frames=args['num_frames'],
+                           frame_step=15, precision=args['float'])
+print(f'[INFO] Saved model bundle metadata to : {bundle_file}')
@@ -0,0 +1,251 @@
+import os
+import pathlib
+import argparse
+import numpy as np
+import tensorflow as tf
+from model_utils import build_classifier, export_stream_tflite, load_classifier, load_pretrained_backbone
+from utils import FrameGenerator, clips_from_video_file
+from bundle import write_bundle
+from postprocess import label_mapping
+
+
+"""
+Knowledge distillation: the fine-tuned A2 model (train_a2.py checkpoint) teaches a
+smaller streaming student (A0/A1). The student learns from the labels and from the
+teacher's softened logits, then goes through the same streaming TFLite export.
+Teacher logits are either computed on the fly from the checkpoint, or cached once
+per video (averaged over evenly spaced clips) with --teacher_logits.
+"""
+
+
+ap = argparse.ArgumentParser()
+ap.add_argument("-i", "--data", type=str, required=True,
+                help="path to data dir")
+ap.add_argument("-b", "--batch_size", type=int, default=8,
+                help="batch_size")
+ap.add_argument("-n", "--num_frames", type=int, default=8,
+                help="num_frames")
+ap.add_argument("-s", "--resolution", type=int, default=172,
+                help="student video resolution")
+ap.add_argument("-e", "--num_epochs", type=int, default=5,
+                help="number of training epochs")
+ap.add_argument("-id", "--model_id", type=str, default='a0',
+                help="student model type, eg: a0, a1")
+ap.add_argument("--pre_ckpt", type=str, required=True,
+                help="path to pre-trained checkpoint dir of the student, eg: movinet_a0_stream/")
+ap.add_argument("--teacher_ckpt", type=str, default=None,
+                help="path to the trained teacher checkpoint (--save_ckpt of train_a2.py)")
+ap.add_argument("--teacher_id", type=str, default='a2',
+                help="teacher model type")
+ap.add_argument("--teacher_resolution", type=int, default=224,
+                help="teacher video resolution")
+ap.add_argument("--teacher_logits", type=str, default=None,
+                help="path to .npz of cached teacher logits per video, computed from --teacher_ckpt if missing")
+ap.add_argument("--num_clips", type=int, default=3,
+                help="clips per video averaged into the cached teacher logits")
+ap.add_argument("--alpha", type=float, default=0.1,
+                help="weight of the label loss, 1 - alpha goes to the distillation loss")
+ap.add_argument("--temperature", type=float, default=4.0,
+                help="softmax temperature of the distillation loss")
+ap.add_argument("--save_ckpt", type=str, required=True,
+                help="path to save trained student checkpoint")
+ap.add_argument("--export", type=str, required=True,
+                help="path to export model")
+ap.add_argument("-o", "--save", type=str, required=True,
+                help="path to export tflite model")
+ap.add_argument("-f", "--float", type=int, default=32,
+                choices=[32, 16],
+                help="model quantization")
+args = vars(ap.parse_args())
+
+if not args['teacher_ckpt'] and not (args['teacher_logits'] and os.path.exists(args['teacher_logits'])):
+    raise SystemExit('[ERROR] Pass --teacher_ckpt, or --teacher_logits pointing to an existing cache')
+
+# Load Data
+path_dir = pathlib.Path(args["data"])
+batch_size = args['batch_size']
+num_frames = args['num_frames']
+resolution = args['resolution']
+teacher_size = (args['teacher_resolution'], args['teacher_resolution'])
+num_classes = len(os.listdir(os.path.join(args["data"], 'test')))
+
+teacher = None
+if args['teacher_ckpt']:
+    teacher = load_classifier(args['teacher_ckpt'], args['teacher_id'], num_classes,
+                              num_frames, args['teacher_resolution'], batch_size)
+    teacher.trainable = False
+
+
+class DistillFrameGenerator(FrameGenerator):
+    def __init__(self, path, n_frames, teacher_logits, training = False, output_size = (224,224)):
+        """ Yields ((frames, cached teacher logits), label), logits keyed by logits_key. """
+        super().__init__(path, n_frames, training, output_size)
+        self.teacher_logits = teacher_logits
+
+    def __call__(self):
+        for path, video_frames, label in self.samples():
+            yield (video_frames, self.teacher_logits[logits_key(path, self.path)]), label
+
+
+def logits_key(path, split_dir):
+    """Video path relative to its split dir, so the cache survives moving or re-spelling --data."""
+    return pathlib.Path(path).relative_to(split_dir).as_posix()
+
+
+train_generator = FrameGenerator(path_dir / 'train', num_frames, training = True, output_size = teacher_size)
+frame_spec = tf.TensorSpec(shape = (None, None, None, 3), dtype = tf.float32)
+label_spec = tf.TensorSpec(shape = (), dtype = tf.int16)
+
+test_ds = tf.data.Dataset.from_generator(FrameGenerator(path_dir / 'test', num_frames, output_size = teacher_size),
+                                         output_signature = (frame_spec, label_spec))
+test_ds = test_ds.batch(batch_size)
+
+
+def teacher_accuracy():
+    teacher.compile(loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True), metrics=['accuracy'])
+    return float(teacher.evaluate(test_ds, return_dict=True, verbose=0)['accuracy'])
+
+
+teacher_acc = None
+if args['teacher_logits']:
+    train_dir = path_dir / 'train'
+    video_paths, _ = train_generator.get_files_and_class_names()
+    teacher_logits = {}
+    if os.path.exists(args['teacher_logits']):
+        cached = np.load(args['teacher_logits'])
+        teacher_logits = dict(zip(cached['paths'], cached['logits']))
+        # Measured on the test split when the cache was built
+        if 'teacher_accuracy' in cached:
+            teacher_acc = float(cached['teacher_accuracy'])
+        print(f'[INFO] Loaded {len(teacher_logits)} cached teacher logits')
+
+    # Check coverage once here, rather than hitting a KeyError in the middle of training
+    missing = [path for path in video_paths if logits_key(path, train_dir) not in teacher_logits]
+    if missing and teacher is None:
+        raise SystemExit(f'[ERROR] {len(missing)} train videos have no cached teacher logits '
+                         f'(eg: {logits_key(missing[0], train_dir)}), pass --teacher_ckpt to fill them in')
+    if missing:
+        for path in missing:
+            clips = clips_from_video_file(path, num_frames, args['num_clips'], teacher_size)
+            teacher_logits[logits_key(path, train_dir)] = teacher(clips, training=False).numpy().mean(axis=0)
+        if teacher_acc is None:
+            teacher_acc = teacher_accuracy()
+        np.savez(args['teacher_logits'], paths=np.array(list(teacher_logits)),
+                 logits=np.stack(list(teacher_logits.values())), teacher_accuracy=teacher_acc)
+        print(f'[INFO] Cached teacher logits for {len(missing)} videos to : {args["teacher_logits"]}')
+    train_generator = DistillFrameGenerator(path_dir / 'train', num_frames, teacher_logits,
+                                            training = True, output_size = teacher_size)
+    output_signature = ((frame_spec, tf.TensorSpec(shape = (num_classes,), dtype = tf.float32)), label_spec)
+else:
+    output_signature = (frame_spec, label_spec)
+
+train_ds = tf.data.Dataset.from_generator(train_generator, output_signature = output_signature)
+train_ds = train_ds.batch(batch_size)
+
+
+class Distiller(tf.keras.Model):
+    def __init__(self, student, teacher=None, alpha=0.1, temperature=4.0, student_resolution=172):
+        """ Trains the student on labels and on the teacher's softened predictions.
+
+        Args:
+            student: Student classifier, trained.
+            teacher: Teacher classifier, frozen; None when the data carries cached teacher logits.
+            alpha: Weight of the label loss.
+            temperature: Softmax temperature of the distillation loss.
+            student_resolution: Clips are fed at the teacher resolution and resized for the student.
+        """
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.alpha = alpha
+        self.temperature = temperature
+        self.student_resolution = student_resolution
+        self.label_loss = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True)
+        self.distill_loss = tf.keras.losses.KLDivergence()
+
+    def resize(self, frames):
+        shape = tf.shape(frames)
+        size = (self.student_resolution, self.student_resolution)
+        if frames.shape[2] == size[0] and frames.shape[3] == size[1]:
+            return frames
+        flat = tf.reshape(frames, tf.concat([[-1], shape[2:]], axis=0))
+        flat = tf.image.resize(flat, size)
+        return tf.reshape(flat, tf.concat([shape[:2], size, [3]], axis=0))
+
+    def call(self, frames, training=False):
+        return self.student(self.resize(frames), training=training)
+
+    def train_step(self, data):
+        inputs, labels = data
+        if self.teacher is None:
+            frames, teacher_logits = inputs
+        else:
+            frames = inputs
+            teacher_logits = self.teacher(frames, training=False)
+
+        with tf.GradientTape() as tape:
+            student_logits = self(frames, training=True)
+            label_loss = self.label_loss(labels, student_logits)
+            t = self.temperature
+            distill_loss = self.distill_loss(tf.nn.softmax(teacher_logits / t),
+                                             tf.nn.softmax(student_logits / t)) * t ** 2
+            loss = self.alpha * label_loss + (1 - self.alpha) * distill_loss
+
+        variables = self.student.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        self.compiled_metrics.update_state(labels, student_logits)
+        return {'loss': loss, 'label_loss': label_loss, 'distill_loss': distill_loss,
+                **{m.name: m.result() for m in self.metrics}}
+
+    def test_step(self, data):
+        frames, labels = data
+        student_logits = self(frames, training=False)
+        self.compiled_metrics.update_state(labels, student_logits)
+        return {'loss': self.label_loss(labels, student_logits),
+                **{m.name: m.result() for m in self.metrics}}
+
+
+# Build Student
+backbone = load_pretrained_backbone(args['model_id'], args['pre_ckpt'])
+student = build_classifier(batch_size, num_frames, resolution, backbone, num_classes)
+
+distiller = Distiller(student, None if args['teacher_logits'] else teacher,
+                      args['alpha'], args['temperature'], resolution)
+distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate = 0.001), metrics=['accuracy'])
+
+# Callback, only the student is checkpointed
+cp_callback = tf.keras.callbacks.LambdaCallback(
+    on_epoch_end=lambda epoch, logs: student.save_weights(args['save_ckpt']))
+
+print('Number of Classes: ', num_classes)
+print('Total Number of Epochs: ', args['num_epochs'])
+print('Batch Size: ', batch_size)
+print(f"Teacher: {args['teacher_id']}, Student: {args['model_id']}")
+
+results = distiller.fit(train_ds,
+                        validation_data=test_ds,
+                        epochs=args['num_epochs'],
+                        validation_freq=1,
+                        callbacks=[cp_callback],
+                        verbose=1)
+print(results.history)
+
+# Accuracy gap on the test split
+student_acc = distiller.evaluate(test_ds, return_dict=True, verbose=0)['accuracy']
+print(f'[INFO] Student ({args["model_id"]}) test accuracy: {student_acc:.4f}')
+if teacher_acc is None and teacher is not None:
+    teacher_acc = teacher_accuracy()
+if teacher_acc is not None:
+    print(f'[INFO] Teacher ({args["teacher_id"]}) test accuracy: {teacher_acc:.4f}, '
+          f'gap: {teacher_acc - student_acc:+.4f}')
+else:
+    print('[INFO] Teacher accuracy unknown: the logits cache predates it, pass --teacher_ckpt to measure the gap')
+
+# Export the student through the streaming TFLite path
+export_stream_tflite(student.get_weights(), args['model_id'], num_classes, resolution,
+                     args['export'], args['save'], args['float'])
+bundle_file = write_bundle(args['save'], train_generator.class_names, label_mapping,
+                           model_id=args['model_id'], resolution=resolution, num_frames=num_frames,
+                           frame_step=15, precision=args['float'])
+print(f'[INFO] Saved model bundle metadata to : {bundle_file}')
+print('[INFO] Compare per-frame latency and accuracy of the exported models with evaluate.py and inference.py --profile')
@@ -64,27 +64,114 @@ def frames_from_video_file(video_path, n_frames, output_size = (224,224), frame_
 
     return result
 
+def clips_from_video_file(video_path, n_frames, n_clips, output_size = (224,224), frame_step = 15):
+    """
+        Creates evenly spaced clips covering the whole video, for multi-clip evaluation.
+
+        Args:
+        video_path: File path to the video.
+        n_frames: Number of frames per clip.
+        n_clips: Number of clips to sample from the video.
+        output_size: Pixel size of the output frame image.
+        frame_step: Number of source frames between two sampled frames.
+
+        Return:
+        An NumPy array of clips in the shape of (n_clips, n_frames, height, width, channels).
+    """
+    src = cv2.VideoCapture(str(video_path))
+    video_length = int(src.get(cv2.CAP_PROP_FRAME_COUNT))
+    need_length = 1 + (n_frames - 1) * frame_step
+    max_start = max(video_length - need_length, 0)
+    starts = np.linspace(0, max_start, n_clips).astype(int)
+
+    empty = np.zeros((*output_size, 3), dtype=np.float32)
+    clips = []
+    for start in starts:
+        src.set(cv2.CAP_PROP_POS_FRAMES, int(start))
+        result = []
+        for i in range(n_frames):
+            # Skip frame_step - 1 frames between sampled frames
+            for _ in range(frame_step if i else 1):
+                ret, frame = src.read()
+            result.append(format_frames(frame, output_size).numpy() if ret else empty)
+        clips.append(result)
+    src.release()
+
+    return np.array(clips)[..., [2, 1, 0]]
+
+def load_tflite_runner(model_path, num_threads=None):
+    """
+        Loads a streaming TFLite model.
+
+        Args:
+        model_path: Path to the tflite model.
+        num_threads: Number of interpreter threads, None for the TFLite default.
+
+        Return:
+        The signature runner and the zero initial stream states.
+    """
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+    runner = interpreter.get_signature_runner()
+    init_states = {
+        name: tf.zeros(x['shape'], dtype=x['dtype'])
+        for name, x in runner.get_input_details().items()
+    }
+    del init_states['image']
+    return runner, init_states
+
+def predict_window(runner, init_states, frames):
+    """
+        Runs the streaming model over a window of frames, starting from fresh states.
+
+        Args:
+        runner: TFLite signature runner.
+        init_states: Initial stream states.
+        frames: RGB uint8 frames at model resolution.
+
+        Return:
+        Class probabilities for the window.
+    """
+    img_norm = np.asarray(frames, dtype=np.float32) / 255.
+    clips = np.split(img_norm[np.newaxis], img_norm.shape[0], axis=1)
+
+    # To run on a video, pass in one frame at a time
+    states = init_states
+    for clip in clips:
+        # Input shape: [1, 1, 224, 224, 3]
+        outputs = runner(**states, image=clip)
+        logits = outputs.pop('logits')[0]
+        states = outputs
+
+    return tf.nn.softmax(logits)
+
 class FrameGenerator:
-    def __init__(self, path, n_frames, training = False):
+    def __init__(self, path, n_frames, training = False, output_size = (224,224), shard = (0, 1)):
         """ Returns a set of frames with their associated label. 
 
         Args:
             path: Video file paths.
             n_frames: Number of frames. 
             training: Boolean to determine if training dataset is being created.
+            output_size: Pixel size of the output frame image.
+            shard: (index, count), only every count-th video starting at index is read.
         """
         self.path = path
         self.n_frames = n_frames
         self.training = training
+        self.output_size = output_size
+        self.shard = shard
         self.class_names = sorted(set(p.name for p in self.path.iterdir() if p.is_dir()))
         self.class_ids_for_name = dict((name, idx) for idx, name in enumerate(self.class_names))
 
     def get_files_and_class_names(self):
-        video_paths = list(self.path.glob('*/*.avi'))
+        # Sorted, so every worker sees the same order before sharding
+        index, count = self.shard
+        video_paths = sorted(self.path.glob('*/*.avi'))[index::count]
         classes = [p.parent.name for p in video_paths] 
         return video_paths, classes
 
-    def __call__(self):
+    def samples(self):
+        """Yields (path, frames, label), shuffled when training."""
         video_paths, classes = self.get_files_and_class_names()
 
         pairs = list(zip(video_paths, classes))
@@ -93,6 +180,10 @@ class FrameGenerator:
             random.shuffle(pairs)
 
         for path, name in pairs:
-            video_frames = frames_from_video_file(path, self.n_frames) 
+            video_frames = frames_from_video_file(path, self.n_frames, self.output_size) 
             label = self.class_ids_for_name[name] # Encode labels
+            yield path, video_frames, label
+
+    def __call__(self):
+        for _, video_frames, label in self.samples():
             yield video_frames, label
@@ -0,0 +1,35 @@
+import queue
+import threading
+import cv2
+
+
+class AsyncVideoWriter:
+    def __init__(self, path, fps, frame_size, fourcc='mp4v', max_queue=64):
+        """ cv2.VideoWriter that encodes on a background thread.
+
+        Args:
+            path: Output video path.
+            fps: Output frame rate.
+            frame_size: (width, height) of the frames.
+            fourcc: Codec fourcc.
+            max_queue: Frames buffered before write() blocks, bounds memory use.
+        """
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            self.writer.write(frame)
+
+    def write(self, frame):
+        self.queue.put(frame)
+
+    def release(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.release()